@@ -11,10 +11,11 @@
 4. 性能优化策略
 """
 
-from typing import TypedDict, Literal, Dict, List, Any
+from typing import Annotated, TypedDict, Literal, Dict, List, Any
 from langgraph.graph import StateGraph, END
 import sys
 import os
+import operator
 import time
 import asyncio
 import concurrent.futures
@@ -30,10 +31,11 @@ class ParallelState(TypedDict):
     并行执行工作流状态
     """
     input_data: Dict[str, Any]
-    parallel_results: Dict[str, Any]
+    # 以下字段使用字典合并 reducer，节点只需返回本次新增的键
+    parallel_results: Annotated[Dict[str, Any], operator.or_]
     merged_result: Dict[str, Any]
-    execution_times: Dict[str, float]
-    task_status: Dict[str, str]
+    execution_times: Annotated[Dict[str, float], operator.or_]
+    task_status: Annotated[Dict[str, str], operator.or_]
     total_time: float
 
 class DataProcessingState(TypedDict):
@@ -148,15 +150,49 @@ def keyword_extractor(text_data: Dict[str, Any]) -> Dict[str, Any]:
 
 # 3. 并行执行节点
 
+# 模块级共享线程池，避免每个节点调用都创建/销毁线程
+_SHARED_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+
+def _parallel_small(tasks: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    执行少量并行任务
+
+    任务数 <= 2 时直接串行执行；否则除最后一个任务外提交到共享线程池，
+    最后一个任务在当前线程内联执行。任务抛出的异常作为结果值返回。
+    """
+    results = {}
+    
+    def run(task_func):
+        try:
+            return task_func()
+        except Exception as exc:
+            return exc
+    
+    if len(tasks) <= 2:
+        for task_name, task_func in tasks.items():
+            results[task_name] = run(task_func)
+        return results
+    
+    *pooled, (last_name, last_func) = tasks.items()
+    futures = {
+        task_name: _SHARED_POOL.submit(run, task_func)
+        for task_name, task_func in pooled
+    }
+    results[last_name] = run(last_func)
+    for task_name, future in futures.items():
+        results[task_name] = future.result()
+    
+    return results
+
 def parallel_data_processing(state: ParallelState) -> ParallelState:
     """
     并行数据处理节点
     """
     print_step("开始并行数据处理")
     
-    input_data = state.get("input_data", {})
-    parallel_results = state.get("parallel_results", {})
-    execution_times = state.get("execution_times", {})
+    # 只收集本节点新增的结果，由 reducer 合并到状态中
+    parallel_results = {}
+    execution_times = {}
     
     # 定义并行任务
     tasks = {
@@ -165,25 +201,15 @@ def parallel_data_processing(state: ParallelState) -> ParallelState:
         "task3": lambda: simulate_processing_task("数据验证", (0.8, 1.2))
     }
     
-    # 使用ThreadPoolExecutor执行并行任务
-    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-        # 提交所有任务
-        future_to_task = {
-            executor.submit(task_func): task_name 
-            for task_name, task_func in tasks.items()
-        }
-        
-        # 收集结果
-        for future in concurrent.futures.as_completed(future_to_task):
-            task_name = future_to_task[future]
-            try:
-                result = future.result()
-                parallel_results[task_name] = result
-                execution_times[task_name] = result["execution_time"]
-            except Exception as exc:
-                print(f"任务 {task_name} 执行失败: {exc}")
-                parallel_results[task_name] = {"status": "failed", "error": str(exc)}
-                execution_times[task_name] = 0.0
+    # 执行并行任务并收集结果
+    for task_name, result in _parallel_small(tasks).items():
+        if isinstance(result, Exception):
+            print(f"任务 {task_name} 执行失败: {result}")
+            parallel_results[task_name] = {"status": "failed", "error": str(result)}
+            execution_times[task_name] = 0.0
+        else:
+            parallel_results[task_name] = result
+            execution_times[task_name] = result["execution_time"]
     
     print(f"并行处理完成，共执行 {len(parallel_results)} 个任务")
     
@@ -200,8 +226,8 @@ def parallel_analysis(state: ParallelState) -> ParallelState:
     print_step("开始并行分析")
     
     input_data = state.get("input_data", {})
-    parallel_results = state.get("parallel_results", {})
-    execution_times = state.get("execution_times", {})
+    parallel_results = {}
+    execution_times = {}
     
     # 并行分析任务
     analysis_tasks = {
@@ -210,21 +236,13 @@ def parallel_analysis(state: ParallelState) -> ParallelState:
         "keyword_extraction": lambda: keyword_extractor(input_data)
     }
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-        future_to_task = {
-            executor.submit(task_func): task_name 
-            for task_name, task_func in analysis_tasks.items()
-        }
-        
-        for future in concurrent.futures.as_completed(future_to_task):
-            task_name = future_to_task[future]
-            try:
-                result = future.result()
-                parallel_results[task_name] = result
-                execution_times[task_name] = time.time()  # 记录完成时间
-            except Exception as exc:
-                print(f"分析任务 {task_name} 失败: {exc}")
-                parallel_results[task_name] = {"analysis_type": task_name, "error": str(exc)}
+    for task_name, result in _parallel_small(analysis_tasks).items():
+        if isinstance(result, Exception):
+            print(f"分析任务 {task_name} 失败: {result}")
+            parallel_results[task_name] = {"analysis_type": task_name, "error": str(result)}
+        else:
+            parallel_results[task_name] = result
+            execution_times[task_name] = time.time()  # 记录完成时间
     
     print(f"并行分析完成")
     
@@ -329,15 +347,14 @@ def parallel_chunk_processor(state: DataProcessingState) -> DataProcessingState:
             "processing_time": end_time - start_time
         }
     
-    # 并行处理所有块
+    def process_chunk_packed(args):
+        """解包 (块编号, 数据块) 后处理，便于 executor.map 批量提交"""
+        i, chunk = args
+        return process_chunk(chunk, i)
+    
+    # 并行处理所有块（一次性批量提交，结果按块顺序返回）
     with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = [
-            executor.submit(process_chunk, chunk, i) 
-            for i, chunk in enumerate(chunks)
-        ]
-        
-        for future in concurrent.futures.as_completed(futures):
-            result = future.result()
+        for result in executor.map(process_chunk_packed, enumerate(chunks)):
             processed_results.append(result)
             print(f"块 {result['chunk_id']} 处理完成: {result['item_count']} 条记录")
     
@@ -673,6 +690,18 @@ def performance_comparison():
 
 # 主程序
 if __name__ == "__main__":
+    demos = {
+        "1": demo_basic_parallel,
+        "2": demo_analysis_parallel,
+        "3": demo_data_processing_parallel,
+        "4": performance_comparison
+    }
+    
+    # 非交互模式：python parallel_execution.py 3
+    if len(sys.argv) > 1 and sys.argv[1] in demos:
+        demos[sys.argv[1]]()
+        sys.exit(0)
+    
     print("⚡ LangGraph 并行执行学习程序")
     print("=" * 60)
     
@@ -686,14 +715,8 @@ if __name__ == "__main__":
         
         choice = input("\n请输入选择 (0-4): ").strip()
         
-        if choice == "1":
-            demo_basic_parallel()
-        elif choice == "2":
-            demo_analysis_parallel()
-        elif choice == "3":
-            demo_data_processing_parallel()
-        elif choice == "4":
-            performance_comparison()
+        if choice in demos:
+            demos[choice]()
         elif choice == "0":
             print_step("感谢学习并行执行！")
             break
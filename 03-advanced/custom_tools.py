@@ -11,37 +11,57 @@
 4. 外部服务调用
 """
 
-from typing import TypedDict, List, Dict, Any, Optional, Callable
-from langgraph.graph import StateGraph, END
+from typing import Annotated, TypedDict, List, Dict, Deque, Any, Optional, Callable
+from langgraph.graph import StateGraph, START, END
 import sys
 import os
-import json
+import io
+import copy
 import time
-import requests
+import random
+import atexit
+import asyncio
+import operator
+import httpx
+import orjson
 import sqlite3
 import csv
+import queue
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import cache
+from itertools import chain
+from pathlib import Path
 from datetime import datetime
-import hashlib
-import base64
-from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
 
 # 添加父目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import print_step, print_result, print_error, Config
+from utils import print_step, print_result, print_error, Config, append_bounded
 
 # 1. 状态定义
+
+# 状态中各结果列表保留的最大条数
+STATE_HISTORY_SIZE = 256
+
 class ToolState(TypedDict):
     """
     工具工作流状态
     """
     task_type: str
     input_data: Dict[str, Any]
-    tool_results: Dict[str, Any]
-    api_responses: List[Dict[str, Any]]
-    database_results: List[Dict[str, Any]]
-    file_results: List[Dict[str, Any]]
+    # 工具节点只返回本次新增的结果，由 reducer 增量合并到状态中；
+    # 结果列表只保留最近 STATE_HISTORY_SIZE 条
+    tool_results: Annotated[Dict[str, Any], operator.or_]
+    api_responses: Annotated[Deque[Dict[str, Any]], append_bounded(STATE_HISTORY_SIZE)]
+    database_results: Annotated[Deque[Dict[str, Any]], append_bounded(STATE_HISTORY_SIZE)]
+    file_results: Annotated[Deque[Dict[str, Any]], append_bounded(STATE_HISTORY_SIZE)]
     combined_output: Dict[str, Any]
-    tool_execution_log: List[Dict[str, Any]]
+    tool_execution_log: Annotated[Deque[Dict[str, Any]], append_bounded(STATE_HISTORY_SIZE)]
     error_log: List[Dict[str, Any]]
 
 class ToolConfig(TypedDict):
@@ -53,14 +73,23 @@ class ToolConfig(TypedDict):
     parameters: Dict[str, Any]
     enabled: bool
     timeout: int
+    simulate_latency: bool
 
 # 2. 基础工具抽象类
 
-class BaseTool(ABC):
+def _approx_size(data: Any) -> int:
+    """估算数据规模：容器取元素个数，避免对嵌套结构做 str() 序列化"""
+    return len(data) if isinstance(data, (dict, list, str, bytes)) else 1
+
+class BaseTool:
     """
     基础工具抽象类
     """
     
+    # 使用 __slots__ 加快属性访问并减少实例内存
+    __slots__ = ("name", "description", "config", "enabled", "timeout",
+                 "execution_count", "last_execution")
+    
     def __init__(self, name: str, description: str, config: Dict[str, Any] = None):
         self.name = name
         self.description = description
@@ -70,28 +99,36 @@ class BaseTool(ABC):
         self.execution_count = 0
         self.last_execution = None
     
-    @abstractmethod
     def execute(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        """执行工具"""
-        pass
+        """执行工具，子类必须实现"""
+        raise NotImplementedError(f"{type(self).__name__} 未实现 execute")
     
     def validate_input(self, input_data: Dict[str, Any]) -> bool:
         """验证输入数据"""
         return True
     
+    def is_idempotent(self, input_data: Dict[str, Any]) -> bool:
+        """相同输入是否总是得到相同结果（可被缓存）"""
+        return self.config.get("idempotent", False)
+    
+    def cache_version(self, input_data: Dict[str, Any]) -> Any:
+        """缓存版本标识，与缓存时不一致则视为失效"""
+        return None
+    
     def log_execution(self, input_data: Dict[str, Any], output_data: Dict[str, Any], 
                       execution_time: float, success: bool):
         """记录执行日志"""
         self.execution_count += 1
-        self.last_execution = datetime.now().isoformat()
+        # 只记录时间戳浮点数，需要展示时再格式化
+        self.last_execution = time.time()
         
         log_entry = {
             "tool_name": self.name,
             "timestamp": self.last_execution,
             "execution_time": execution_time,
             "success": success,
-            "input_size": len(str(input_data)),
-            "output_size": len(str(output_data)) if success else 0
+            "input_size": _approx_size(input_data),
+            "output_size": _approx_size(output_data) if success else 0
         }
         
         return log_entry
@@ -103,22 +140,46 @@ class BaseTool(ABC):
             "description": self.description,
             "enabled": self.enabled,
             "execution_count": self.execution_count,
-            "last_execution": self.last_execution,
+            "last_execution": datetime.fromtimestamp(self.last_execution).isoformat()
+                              if self.last_execution is not None else None,
             "timeout": self.timeout
         }
 
 # 3. 具体工具实现
 
+# 共享的 HTTP 客户端，复用 keep-alive 连接，避免每次调用重新握手
+_HTTP_CLIENT: Optional[httpx.Client] = None
+
+def get_http_client() -> httpx.Client:
+    """获取共享的 HTTP 客户端"""
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None:
+        _HTTP_CLIENT = httpx.Client(
+            timeout=10,
+            limits=httpx.Limits(max_keepalive_connections=20)
+        )
+        atexit.register(_HTTP_CLIENT.close)
+    return _HTTP_CLIENT
+
 class WeatherAPITool(BaseTool):
     """
     天气API工具
     """
     
+    __slots__ = ("base_url",)
+    
     def __init__(self):
         super().__init__(
             name="weather_api",
             description="获取天气信息",
-            config={"timeout": 10, "api_key": "demo_key"}
+            config={
+                "timeout": 10,
+                "api_key": os.getenv("OPENWEATHER_API_KEY", "demo_key"),
+                "idempotent": True,
+                "cache_ttl": 300,  # 天气数据 5 分钟内复用
+                # 模拟网络延迟默认关闭，设置 TOOL_SIMULATE_LATENCY=1 开启
+                "simulate_latency": os.getenv("TOOL_SIMULATE_LATENCY") == "1"
+            }
         )
         self.base_url = "https://api.openweathermap.org/data/2.5/weather"
     
@@ -132,28 +193,47 @@ class WeatherAPITool(BaseTool):
         try:
             city = input_data.get("city", "Beijing")
             
-            # 模拟API调用（实际项目中调用真实API）
-            # 这里使用模拟数据
-            mock_weather_data = {
-                "city": city,
-                "temperature": random.randint(-10, 35),
-                "humidity": random.randint(30, 90),
-                "weather": random.choice(["晴", "多云", "雨", "雪"]),
-                "wind_speed": random.uniform(0, 20),
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            # 模拟网络延迟
-            time.sleep(random.uniform(0.5, 2.0))
+            if self.config["api_key"] != "demo_key":
+                # 配置了真实 API Key 时，通过共享连接池调用天气API
+                response = get_http_client().get(
+                    self.base_url,
+                    params={"q": city, "appid": self.config["api_key"], "units": "metric"},
+                    timeout=self.timeout
+                )
+                response.raise_for_status()
+                data = response.json()
+                
+                weather_data = {
+                    "city": city,
+                    "temperature": data["main"]["temp"],
+                    "humidity": data["main"]["humidity"],
+                    "weather": data["weather"][0]["description"],
+                    "wind_speed": data["wind"]["speed"],
+                    "timestamp": datetime.now().isoformat()
+                }
+            else:
+                # 模拟API调用（未配置 API Key 时使用模拟数据）
+                weather_data = {
+                    "city": city,
+                    "temperature": random.randint(-10, 35),
+                    "humidity": random.randint(30, 90),
+                    "weather": random.choice(["晴", "多云", "雨", "雪"]),
+                    "wind_speed": random.uniform(0, 20),
+                    "timestamp": datetime.now().isoformat()
+                }
+                
+                # 模拟网络延迟
+                if self.config.get("simulate_latency", False):
+                    time.sleep(random.uniform(0.5, 2.0))
             
             execution_time = time.time() - start_time
             success = True
             
-            log_entry = self.log_execution(input_data, mock_weather_data, execution_time, success)
+            log_entry = self.log_execution(input_data, weather_data, execution_time, success)
             
             return {
                 "status": "success",
-                "data": mock_weather_data,
+                "data": weather_data,
                 "source": "weather_api",
                 "execution_log": log_entry
             }
@@ -180,6 +260,18 @@ class DatabaseTool(BaseTool):
     数据库工具
     """
     
+    __slots__ = ("db_path", "_initialized", "_insert_sql", "_write_conn",
+                 "_write_lock", "_read_pool")
+    
+    # 每次建立连接后执行的性能调优 PRAGMA
+    CONNECTION_PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000",
+        "PRAGMA cache_size=-20000",
+        "PRAGMA temp_store=MEMORY"
+    )
+    
     def __init__(self, db_path: str = "tools_demo.db"):
         super().__init__(
             name="database_tool",
@@ -187,52 +279,112 @@ class DatabaseTool(BaseTool):
             config={"timeout": 15}
         )
         self.db_path = db_path
+        self._initialized = False
+        
+        # 按 (表名, 列) 形状缓存的 INSERT 语句，配合连接级语句缓存复用预编译结果
+        self._insert_sql: Dict[tuple, str] = {}
+        
+        # 连接池：一个串行化的写连接 + 多个只读连接
+        self._write_conn = self._connect()
+        self._write_lock = threading.Lock()
         self.init_database()
+        
+        self._read_pool = queue.Queue()
+        for _ in range(max(4, os.cpu_count() or 1)):
+            self._read_pool.put(self._connect(read_only=True))
+    
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        """建立数据库连接并应用性能调优 PRAGMA"""
+        if read_only:
+            uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, isolation_level=None,
+                                   check_same_thread=False, cached_statements=256)
+        else:
+            conn = sqlite3.connect(self.db_path, isolation_level=None,
+                                   check_same_thread=False, cached_statements=256)
+        
+        for pragma in self.CONNECTION_PRAGMAS:
+            # 只读连接无法切换日志模式，WAL 已由写连接持久化设置
+            if read_only and pragma.startswith("PRAGMA journal_mode"):
+                continue
+            conn.execute(pragma)
+        return conn
+    
+    @contextmanager
+    def _reader(self):
+        """从只读连接池借出一个连接，用完归还"""
+        conn = self._read_pool.get()
+        try:
+            yield conn
+        finally:
+            self._read_pool.put(conn)
     
     def init_database(self):
         """初始化数据库"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY,
-                name TEXT,
-                category TEXT,
-                price REAL,
-                stock INTEGER,
-                created_at TEXT
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY,
-                username TEXT,
-                email TEXT,
-                role TEXT,
-                created_at TEXT
-            )
-        ''')
-        
-        # 插入示例数据
-        cursor.execute("SELECT COUNT(*) FROM products")
-        if cursor.fetchone()[0] == 0:
-            products = [
-                ("笔记本电脑", "电子产品", 5999.99, 50),
-                ("无线鼠标", "电子产品", 199.99, 200),
-                ("机械键盘", "电子产品", 899.99, 100),
-                ("显示器", "电子产品", 2499.99, 30),
-                ("USB集线器", "电子产品", 99.99, 150)
-            ]
-            
-            cursor.executemany(
-                "INSERT INTO products (name, category, price, stock, created_at) VALUES (?, ?, ?, ?, ?)",
-                [(name, category, price, stock, datetime.now().isoformat()) for name, category, price, stock in products]
-            )
+        if self._initialized:
+            return
         
-        conn.commit()
-        conn.close()
+        with self._write_lock:
+            cursor = self._write_conn.cursor()
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS products (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT,
+                    category TEXT,
+                    price REAL,
+                    stock INTEGER,
+                    created_at TEXT
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY,
+                    username TEXT,
+                    email TEXT,
+                    role TEXT,
+                    created_at TEXT
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS tool_executions (
+                    id INTEGER PRIMARY KEY,
+                    tool_name TEXT,
+                    timestamp TEXT,
+                    success INTEGER,
+                    execution_time REAL,
+                    input_data TEXT
+                )
+            ''')
+            
+            # 插入示例数据：用 user_version 标记是否已初始化，热启动时无需扫描数据表
+            cursor.execute("PRAGMA user_version")
+            if cursor.fetchone()[0] == 0:
+                cursor.execute("BEGIN IMMEDIATE")
+                
+                # 兼容旧版本创建的数据库：已有数据时只补写版本标记
+                cursor.execute("SELECT COUNT(*) FROM products")
+                if cursor.fetchone()[0] == 0:
+                    now = datetime.now().isoformat()
+                    products = [
+                        ("笔记本电脑", "电子产品", 5999.99, 50),
+                        ("无线鼠标", "电子产品", 199.99, 200),
+                        ("机械键盘", "电子产品", 899.99, 100),
+                        ("显示器", "电子产品", 2499.99, 30),
+                        ("USB集线器", "电子产品", 99.99, 150)
+                    ]
+                    
+                    cursor.executemany(
+                        "INSERT INTO products (name, category, price, stock, created_at) VALUES (?, ?, ?, ?, ?)",
+                        [(name, category, price, stock, now) for name, category, price, stock in products]
+                    )
+                
+                cursor.execute("PRAGMA user_version = 1")
+                cursor.execute("COMMIT")
+            
+            self._initialized = True
     
     def execute(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """执行数据库操作"""
@@ -281,24 +433,55 @@ class DatabaseTool(BaseTool):
             
             return error_result
     
+    # where 条件支持的比较运算符
+    WHERE_OPERATORS = ("=", "!=", ">", ">=", "<", "<=")
+    
+    @staticmethod
+    def _check_identifier(name: str) -> str:
+        """校验表名/列名，防止拼接进 SQL 的标识符被注入"""
+        if not isinstance(name, str) or not name.isidentifier():
+            raise ValueError(f"非法的标识符: {name!r}")
+        return name
+    
+    def _build_where(self, input_data: Dict[str, Any], default: Dict[str, Any] = None) -> tuple:
+        """
+        将 where 字典编译为参数化的 WHERE 子句
+        
+        where 形如 {"category": "电子产品"} 或 {"price": (">", 500)}，
+        返回 (" WHERE ...", 参数列表)；条件为空时返回 ("", [])。
+        """
+        if isinstance(input_data.get("condition"), str):
+            raise ValueError("不再支持字符串 condition，请使用 where 字典")
+        
+        where = input_data.get("where", default) or {}
+        clauses = []
+        params = []
+        
+        for column, value in where.items():
+            self._check_identifier(column)
+            op = "="
+            if isinstance(value, (tuple, list)):
+                op, value = value
+                if op not in self.WHERE_OPERATORS:
+                    raise ValueError(f"不支持的运算符: {op}")
+            clauses.append(f"{column} {op} ?")
+            params.append(value)
+        
+        if not clauses:
+            return "", []
+        return " WHERE " + " AND ".join(clauses), params
+    
     def _query_data(self, input_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """查询数据"""
-        table = input_data.get("table", "products")
-        condition = input_data.get("condition", "")
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        if condition:
-            query = f"SELECT * FROM {table} WHERE {condition}"
-            cursor.execute(query)
-        else:
-            cursor.execute(f"SELECT * FROM {table}")
-        
-        columns = [desc[0] for desc in cursor.description]
-        rows = cursor.fetchall()
+        table = self._check_identifier(input_data.get("table", "products"))
+        where_clause, params = self._build_where(input_data)
         
-        conn.close()
+        with self._reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT * FROM {table}{where_clause}", params)
+            
+            columns = [desc[0] for desc in cursor.description]
+            rows = cursor.fetchall()
         
         return [
             dict(zip(columns, row))
@@ -307,67 +490,93 @@ class DatabaseTool(BaseTool):
     
     def _insert_data(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """插入数据"""
-        table = input_data.get("table", "products")
+        table = self._check_identifier(input_data.get("table", "products"))
         data = input_data.get("data", {})
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        columns = list(data.keys())
-        placeholders = ["?"] * len(columns)
+        columns = tuple(self._check_identifier(column) for column in data.keys())
         values = list(data.values())
         
         if table == "products":
             values.append(datetime.now().isoformat())  # created_at
-            columns.append("created_at")
+            columns += ("created_at",)
         
-        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(placeholders)})"
-        cursor.execute(query, values)
+        query = self._insert_sql.get((table, columns))
+        if query is None:
+            placeholders = ", ".join(["?"] * len(columns))
+            query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+            self._insert_sql[(table, columns)] = query
         
-        last_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with self._write_lock:
+            # 连接处于自动提交模式，单条语句执行完即已提交
+            cursor = self._write_conn.execute(query, values)
+            last_id = cursor.lastrowid
         
         return {"inserted_id": last_id, "affected_rows": 1}
     
     def _update_data(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """更新数据"""
-        table = input_data.get("table", "products")
+        table = self._check_identifier(input_data.get("table", "products"))
         data = input_data.get("data", {})
-        condition = input_data.get("condition", "id = 1")
+        where_clause, params = self._build_where(input_data, default={"id": 1})
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        set_clause = ", ".join([f"{self._check_identifier(key)} = ?" for key in data.keys()])
+        values = list(data.values()) + params
         
-        set_clause = ", ".join([f"{key} = ?" for key in data.keys()])
-        values = list(data.values())
-        
-        query = f"UPDATE {table} SET {set_clause} WHERE {condition}"
-        cursor.execute(query, values)
+        query = f"UPDATE {table} SET {set_clause}{where_clause}"
         
-        affected_rows = cursor.rowcount
-        conn.commit()
-        conn.close()
+        with self._write_lock:
+            cursor = self._write_conn.execute(query, values)
+            affected_rows = cursor.rowcount
         
         return {"affected_rows": affected_rows}
     
     def _delete_data(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """删除数据"""
-        table = input_data.get("table", "products")
-        condition = input_data.get("condition", "1 = 0")  # 默认不删除
+        table = self._check_identifier(input_data.get("table", "products"))
+        where_clause, params = self._build_where(input_data)
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # 默认不删除：没有 where 条件时拒绝执行整表删除
+        if not where_clause:
+            return {"affected_rows": 0}
         
-        query = f"DELETE FROM {table} WHERE {condition}"
-        cursor.execute(query)
+        query = f"DELETE FROM {table}{where_clause}"
         
-        affected_rows = cursor.rowcount
-        conn.commit()
-        conn.close()
+        with self._write_lock:
+            cursor = self._write_conn.execute(query, params)
+            affected_rows = cursor.rowcount
         
         return {"affected_rows": affected_rows}
     
+    def is_idempotent(self, input_data: Dict[str, Any]) -> bool:
+        """只有查询操作可以缓存"""
+        return input_data.get("operation", "query") == "query"
+    
+    def save_execution_records(self, records: List[Dict[str, Any]]):
+        """在单个事务中批量写入工具执行记录"""
+        rows = [
+            (
+                record["tool_name"],
+                record["timestamp"],
+                int(record["success"]),
+                record["result"].get("execution_log", {}).get("execution_time", 0),
+                orjson.dumps(record["input_data"], default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+            )
+            for record in records
+        ]
+        
+        with self._write_lock:
+            conn = self._write_conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO tool_executions (tool_name, timestamp, success, execution_time, input_data) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    
     def validate_input(self, input_data: Dict[str, Any]) -> bool:
         """验证输入"""
         return "operation" in input_data
@@ -377,6 +586,8 @@ class FileProcessingTool(BaseTool):
     文件处理工具
     """
     
+    __slots__ = ("work_dir",)
+    
     def __init__(self, work_dir: str = "files"):
         super().__init__(
             name="file_processing",
@@ -433,22 +644,31 @@ class FileProcessingTool(BaseTool):
             
             return error_result
     
+    @staticmethod
+    def _read_text(filepath: str, missing_message: str) -> str:
+        """
+        读取文本文件
+        
+        直接打开文件并捕获 FileNotFoundError，省去先 exists 再 open 的额外 stat 系统调用。
+        """
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise FileNotFoundError(missing_message) from None
+    
     def _read_file(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """读取文件"""
         filename = input_data.get("filename", "")
         filepath = os.path.join(self.work_dir, filename)
         
-        if not os.path.exists(filepath):
-            raise FileNotFoundError(f"文件不存在: {filepath}")
-        
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
+        content = self._read_text(filepath, f"文件不存在: {filepath}")
         
         return {
             "filename": filename,
             "content": content,
             "size": len(content),
-            "lines": len(content.split('\n'))
+            "lines": content.count('\n') + 1
         }
     
     def _write_file(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -472,11 +692,26 @@ class FileProcessingTool(BaseTool):
         filename = input_data.get("filename", "")
         filepath = os.path.join(self.work_dir, filename)
         
-        if not os.path.exists(filepath):
-            raise FileNotFoundError(f"文件不存在: {filepath}")
+        # 文本文件只打开一次，元数据直接对已打开的描述符 fstat，省去按路径再解析一次；
+        # 其他文件只需 stat（stat/open 本身即可判断文件是否存在）
+        is_text = filename.endswith(('.txt', '.csv', '.json', '.md'))
+        try:
+            f = open(filepath, 'r', encoding='utf-8', buffering=1 << 20) if is_text else None
+        except FileNotFoundError:
+            raise FileNotFoundError(f"文件不存在: {filepath}") from None
         
-        # 文件基本信息
-        stat = os.stat(filepath)
+        try:
+            return self._analyze_opened_file(filename, filepath, f)
+        finally:
+            if f is not None:
+                f.close()
+    
+    def _analyze_opened_file(self, filename: str, filepath: str, f: Optional[io.TextIOBase]) -> Dict[str, Any]:
+        """分析文件：f 为已打开的文本文件（非文本文件为 None），由调用方负责关闭"""
+        try:
+            stat = os.fstat(f.fileno()) if f is not None else os.stat(filepath)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"文件不存在: {filepath}") from None
         
         analysis = {
             "filename": filename,
@@ -488,19 +723,26 @@ class FileProcessingTool(BaseTool):
         }
         
         # 如果是文本文件，进行内容分析
-        if filename.endswith(('.txt', '.csv', '.json', '.md')):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
+        if f is not None:
+            # 逐行流式读取并累计统计，内存占用与文件大小无关
+            content_length = 0
+            newline_count = 0
+            word_count = 0
+            
+            for line in f:
+                content_length += len(line)
+                word_count += len(line.split())
+                if line.endswith('\n'):
+                    newline_count += 1
             
-            lines = content.split('\n')
-            words = content.split()
+            line_count = newline_count + 1
             
             analysis.update({
-                "content_length": len(content),
-                "line_count": len(lines),
-                "word_count": len(words),
-                "character_count": len(content),
-                "avg_line_length": sum(len(line) for line in lines) / len(lines) if lines else 0
+                "content_length": content_length,
+                "line_count": line_count,
+                "word_count": word_count,
+                "character_count": content_length,
+                "avg_line_length": (content_length - newline_count) / line_count
             })
         
         return analysis
@@ -511,12 +753,9 @@ class FileProcessingTool(BaseTool):
         target_format = input_data.get("target_format", "txt")
         
         source_filepath = os.path.join(self.work_dir, source_filename)
-        if not os.path.exists(source_filepath):
-            raise FileNotFoundError(f"源文件不存在: {source_filepath}")
         
         # 读取源文件
-        with open(source_filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
+        content = self._read_text(source_filepath, f"源文件不存在: {source_filepath}")
         
         # 生成目标文件名
         base_name = os.path.splitext(source_filename)[0]
@@ -525,10 +764,13 @@ class FileProcessingTool(BaseTool):
         
         # 简单的格式转换
         if target_format == "json":
-            converted_content = json.dumps({"content": content}, ensure_ascii=False, indent=2)
+            converted_content = orjson.dumps({"content": content}, option=orjson.OPT_INDENT_2).decode()
         elif target_format == "csv":
-            lines = content.split('\n')
-            converted_content = '\n'.join([f'"{line}"' for line in lines if line])
+            # csv.writer 由 C 扩展实现，并会正确转义行内的引号
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator='\n')
+            writer.writerows([line] for line in content.split('\n') if line)
+            converted_content = buffer.getvalue()
         else:
             converted_content = content  # 默认不转换
         
@@ -544,6 +786,18 @@ class FileProcessingTool(BaseTool):
             "converted_at": datetime.now().isoformat()
         }
     
+    def is_idempotent(self, input_data: Dict[str, Any]) -> bool:
+        """只有读取和分析操作可以缓存"""
+        return input_data.get("operation", "read") in ("read", "analyze")
+    
+    def cache_version(self, input_data: Dict[str, Any]) -> Any:
+        """以文件修改时间作为缓存版本，文件被外部修改后缓存自动失效"""
+        filepath = os.path.join(self.work_dir, input_data.get("filename", ""))
+        try:
+            return os.stat(filepath).st_mtime_ns
+        except OSError:
+            return None
+    
     def validate_input(self, input_data: Dict[str, Any]) -> bool:
         """验证输入"""
         return "operation" in input_data
@@ -553,11 +807,13 @@ class LLMIntegrationTool(BaseTool):
     LLM集成工具
     """
     
+    __slots__ = ("api_base", "api_key", "model")
+    
     def __init__(self):
         super().__init__(
             name="llm_integration",
             description="LLM模型调用工具",
-            config={"timeout": 60}
+            config={"timeout": 60, "idempotent": True}
         )
         # 注意：这里使用硅基流动API
         self.api_base = Config.OPENAI_BASE_URL
@@ -634,48 +890,125 @@ class ToolManager:
     工具管理器
     """
     
+    # 默认注册的工具类型，所有实例共用
+    DEFAULT_TOOLS = (WeatherAPITool, DatabaseTool, FileProcessingTool, LLMIntegrationTool)
+    
     def __init__(self):
         self.tools = {}
         self.execution_history = []
+        # 幂等工具的结果缓存：key -> (缓存时间, 缓存版本, 结果)
+        self._memo: Dict[bytes, tuple] = {}
+        self._cache_hits = 0
+        self._cache_misses = 0
+        # 批量执行时多个线程同时读写缓存和计数器，由锁保护（工具执行本身不持锁）
+        self._memo_lock = threading.Lock()
         self._register_default_tools()
     
     def _register_default_tools(self):
         """注册默认工具"""
-        self.register_tool(WeatherAPITool())
-        self.register_tool(DatabaseTool())
-        self.register_tool(FileProcessingTool())
-        self.register_tool(LLMIntegrationTool())
+        for tool_cls in self.DEFAULT_TOOLS:
+            self.register_tool(tool_cls())
     
     def register_tool(self, tool: BaseTool):
         """注册工具"""
         self.tools[tool.name] = tool
         print(f"工具已注册: {tool.name}")
     
-    def execute_tool(self, tool_name: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        """执行工具"""
-        if tool_name not in self.tools:
+    def _run_tool(self, tool_name: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """执行单个工具并返回执行记录"""
+        tool = self.tools.get(tool_name)
+        if tool is None:
             raise ValueError(f"工具不存在: {tool_name}")
         
-        tool = self.tools[tool_name]
         if not tool.enabled:
             raise ValueError(f"工具已禁用: {tool_name}")
         
-        # 执行工具
-        result = tool.execute(input_data)
+        result = self._execute_with_memo(tool, input_data)
         
-        # 记录执行历史
-        execution_record = {
+        return {
             "tool_name": tool_name,
             "timestamp": datetime.now().isoformat(),
             "input_data": input_data,
             "result": result,
             "success": result.get("status") == "success"
         }
+    
+    def _execute_with_memo(self, tool: BaseTool, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """执行工具，幂等调用命中缓存时直接返回之前的结果"""
+        if not tool.is_idempotent(input_data):
+            # 写操作可能改变后续读取的结果，清除该工具的缓存（无论输入能否序列化）
+            self.invalidate(tool.name)
+            return tool.execute(input_data)
+        
+        try:
+            key = tool.name.encode() + b"\0" + orjson.dumps(input_data, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            return tool.execute(input_data)  # 输入无法序列化时不缓存
+        
+        version = tool.cache_version(input_data)
+        ttl = tool.config.get("cache_ttl")
+        with self._memo_lock:
+            cached = self._memo.get(key)
+            if (cached is not None and cached[1] == version
+                    and (ttl is None or time.monotonic() - cached[0] < ttl)):
+                self._cache_hits += 1
+                return copy.deepcopy(cached[2])  # 返回副本，调用方修改结果不会影响缓存
         
-        self.execution_history.append(execution_record)
+        result = tool.execute(input_data)
+        with self._memo_lock:
+            self._cache_misses += 1
+            if result.get("status") == "success":
+                self._memo[key] = (time.monotonic(), version, copy.deepcopy(result))
         
         return result
     
+    def invalidate(self, tool_name: Optional[str] = None):
+        """清除指定工具（默认全部工具）的结果缓存"""
+        with self._memo_lock:
+            if tool_name is None:
+                self._memo.clear()
+                return
+            
+            prefix = tool_name.encode() + b"\0"
+            for cached_key in [k for k in self._memo if k.startswith(prefix)]:
+                del self._memo[cached_key]
+    
+    def cache_info(self) -> Dict[str, int]:
+        """获取缓存统计，字段与 functools.lru_cache 的 cache_info 对应"""
+        with self._memo_lock:
+            return {
+                "hits": self._cache_hits,
+                "misses": self._cache_misses,
+                "currsize": len(self._memo)
+            }
+    
+    def _record_history(self, records: List[Dict[str, Any]]):
+        """记录执行历史，并在一个事务中持久化到数据库"""
+        self.execution_history.extend(records)
+        
+        database_tool = self.tools.get("database_tool")
+        if records and database_tool is not None:
+            database_tool.save_execution_records(records)
+    
+    def execute_tool(self, tool_name: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """执行工具"""
+        execution_record = self._run_tool(tool_name, input_data)
+        self._record_history([execution_record])
+        
+        return execution_record["result"]
+    
+    def execute_batch(self, calls: List[tuple]) -> List[Dict[str, Any]]:
+        """
+        批量执行工具
+        
+        calls 为 (tool_name, input_data) 列表，按顺序执行，
+        所有执行记录在一个事务中写入数据库。
+        """
+        records = [self._run_tool(tool_name, input_data) for tool_name, input_data in calls]
+        self._record_history(records)
+        
+        return [record["result"] for record in records]
+    
     def get_tool_stats(self) -> Dict[str, Any]:
         """获取工具统计"""
         stats = {}
@@ -699,84 +1032,113 @@ class ToolManager:
             for tool in self.tools.values()
         ]
 
+# 全局工具管理器，避免每个节点重复注册工具和初始化数据库
+_TOOL_MANAGER: Optional[ToolManager] = None
+
+def get_tool_manager() -> ToolManager:
+    """获取共享的工具管理器实例"""
+    global _TOOL_MANAGER
+    if _TOOL_MANAGER is None:
+        _TOOL_MANAGER = ToolManager()
+    return _TOOL_MANAGER
+
+# 工具分支的最大并行度，阻塞的工具调用在专用线程池中执行
+MAX_TOOL_PARALLELISM = 4
+_TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=MAX_TOOL_PARALLELISM, thread_name_prefix="tool")
+
+async def run_tool_batch(tool_manager: ToolManager, calls: List[tuple]) -> List[Dict[str, Any]]:
+    """在工具线程池中批量执行工具调用，不阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_TOOL_EXECUTOR, tool_manager.execute_batch, calls)
+
 # 5. 工作流节点
 
-def api_tool_execution(state: ToolState) -> ToolState:
+async def api_tool_execution(state: ToolState) -> ToolState:
     """API工具执行节点"""
-    print_step("执行API工具")
+    logger.info("执行API工具")
     
     task_data = state.get("input_data", {})
-    api_responses = state.get("api_responses", [])
-    tool_execution_log = state.get("tool_execution_log", [])
+    api_responses = []
+    tool_execution_log = []
     
-    tool_manager = ToolManager()
+    tool_manager = get_tool_manager()
+    
+    # 收集本节点的工具调用，一次批量执行
+    calls = []
     
     # 执行天气API工具
     if task_data.get("use_weather_api", False):
         city = task_data.get("city", "北京")
-        weather_input = {"city": city}
-        
-        result = tool_manager.execute_tool("weather_api", weather_input)
+        calls.append(("weather_api", {"city": city}))
+    
+    # 在工具线程池中执行阻塞的工具调用，使并行分支可以同时进行
+    for result in await run_tool_batch(tool_manager, calls):
         api_responses.append(result)
         
         if result.get("status") == "success":
             log_entry = result.get("execution_log", {})
             tool_execution_log.append(log_entry)
-            print(f"天气API调用成功: {result['data']['city']}")
+            logger.info("天气API调用成功: %s", result["data"]["city"])
         else:
-            print_error(f"天气API调用失败: {result.get('error')}")
+            logger.error("天气API调用失败: %s", result.get("error"))
     
     return {
         "api_responses": api_responses,
         "tool_execution_log": tool_execution_log
     }
 
-def database_tool_execution(state: ToolState) -> ToolState:
+async def database_tool_execution(state: ToolState) -> ToolState:
     """数据库工具执行节点"""
-    print_step("执行数据库工具")
+    logger.info("执行数据库工具")
     
     task_data = state.get("input_data", {})
-    database_results = state.get("database_results", [])
-    tool_execution_log = state.get("tool_execution_log", [])
+    database_results = []
+    tool_execution_log = []
+    
+    tool_manager = get_tool_manager()
     
-    tool_manager = ToolManager()
+    calls = []
     
     # 执行数据库查询
     if task_data.get("query_database", False):
         table = task_data.get("table", "products")
-        condition = task_data.get("condition", "")
+        where = task_data.get("where", {})
         
         db_input = {
             "operation": "query",
             "table": table,
-            "condition": condition
+            "where": where
         }
-        
-        result = tool_manager.execute_tool("database_tool", db_input)
+        calls.append(("database_tool", db_input))
+    
+    # 在工具线程池中执行阻塞的工具调用，使并行分支可以同时进行
+    for result in await run_tool_batch(tool_manager, calls):
         database_results.append(result)
         
         if result.get("status") == "success":
             log_entry = result.get("execution_log", {})
             tool_execution_log.append(log_entry)
             data = result.get("data", [])
-            print(f"数据库查询成功，返回 {len(data)} 条记录")
+            logger.info("数据库查询成功，返回 %s 条记录", len(data))
         else:
-            print_error(f"数据库查询失败: {result.get('error')}")
+            logger.error("数据库查询失败: %s", result.get("error"))
     
     return {
         "database_results": database_results,
         "tool_execution_log": tool_execution_log
     }
 
-def file_tool_execution(state: ToolState) -> ToolState:
+async def file_tool_execution(state: ToolState) -> ToolState:
     """文件工具执行节点"""
-    print_step("执行文件工具")
+    logger.info("执行文件工具")
     
     task_data = state.get("input_data", {})
-    file_results = state.get("file_results", [])
-    tool_execution_log = state.get("tool_execution_log", [])
+    file_results = []
+    tool_execution_log = []
     
-    tool_manager = ToolManager()
+    tool_manager = get_tool_manager()
+    
+    calls = []
     
     # 创建示例文件
     if task_data.get("create_sample_file", False):
@@ -797,16 +1159,7 @@ LangGraph工具系统演示
             "filename": filename,
             "content": content
         }
-        
-        result = tool_manager.execute_tool("file_processing", file_input)
-        file_results.append(result)
-        
-        if result.get("status") == "success":
-            log_entry = result.get("execution_log", {})
-            tool_execution_log.append(log_entry)
-            print(f"文件创建成功: {filename}")
-        else:
-            print_error(f"文件创建失败: {result.get('error')}")
+        calls.append(("file_processing", file_input))
     
     # 分析文件
     if task_data.get("analyze_file", False):
@@ -816,32 +1169,46 @@ LangGraph工具系统演示
             "operation": "analyze",
             "filename": filename
         }
-        
-        result = tool_manager.execute_tool("file_processing", analyze_input)
+        calls.append(("file_processing", analyze_input))
+    
+    # 按顺序批量执行（先写入再分析）
+    results = await run_tool_batch(tool_manager, calls)
+    
+    for (_, file_input), result in zip(calls, results):
         file_results.append(result)
         
-        if result.get("status") == "success":
-            log_entry = result.get("execution_log", {})
-            tool_execution_log.append(log_entry)
-            data = result.get("data", {})
-            print(f"文件分析成功: {data.get('size', 0)} 字节")
+        if file_input["operation"] == "write":
+            if result.get("status") == "success":
+                log_entry = result.get("execution_log", {})
+                tool_execution_log.append(log_entry)
+                logger.info("文件创建成功: %s", file_input["filename"])
+            else:
+                logger.error("文件创建失败: %s", result.get("error"))
         else:
-            print_error(f"文件分析失败: {result.get('error')}")
+            if result.get("status") == "success":
+                log_entry = result.get("execution_log", {})
+                tool_execution_log.append(log_entry)
+                data = result.get("data", {})
+                logger.info("文件分析成功: %s 字节", data.get("size", 0))
+            else:
+                logger.error("文件分析失败: %s", result.get("error"))
     
     return {
         "file_results": file_results,
         "tool_execution_log": tool_execution_log
     }
 
-def llm_tool_execution(state: ToolState) -> ToolState:
+async def llm_tool_execution(state: ToolState) -> ToolState:
     """LLM工具执行节点"""
-    print_step("执行LLM工具")
+    logger.info("执行LLM工具")
     
     task_data = state.get("input_data", {})
-    tool_results = state.get("tool_results", {})
-    tool_execution_log = state.get("tool_execution_log", [])
+    tool_results = {}
+    tool_execution_log = []
     
-    tool_manager = ToolManager()
+    tool_manager = get_tool_manager()
+    
+    calls = []
     
     # 调用LLM工具
     if task_data.get("use_llm", False):
@@ -852,16 +1219,18 @@ def llm_tool_execution(state: ToolState) -> ToolState:
             "prompt": prompt,
             "max_tokens": max_tokens
         }
-        
-        result = tool_manager.execute_tool("llm_integration", llm_input)
+        calls.append(("llm_integration", llm_input))
+    
+    # 在工具线程池中执行阻塞的工具调用，使并行分支可以同时进行
+    for result in await run_tool_batch(tool_manager, calls):
         tool_results["llm_result"] = result
         
         if result.get("status") == "success":
             log_entry = result.get("execution_log", {})
             tool_execution_log.append(log_entry)
-            print(f"LLM调用成功")
+            logger.info("LLM调用成功")
         else:
-            print_error(f"LLM调用失败: {result.get('error')}")
+            logger.error("LLM调用失败: %s", result.get("error"))
     
     return {
         "tool_results": tool_results,
@@ -870,7 +1239,7 @@ def llm_tool_execution(state: ToolState) -> ToolState:
 
 def combine_results(state: ToolState) -> ToolState:
     """合并结果节点"""
-    print_step("合并工具执行结果")
+    logger.info("合并工具执行结果")
     
     api_responses = state.get("api_responses", [])
     database_results = state.get("database_results", [])
@@ -882,9 +1251,11 @@ def combine_results(state: ToolState) -> ToolState:
     successful_tools = []
     failed_tools = []
     
-    all_results = api_responses + database_results + file_results + list(tool_results.values())
+    total_results = 0
     
-    for result in all_results:
+    # 单次遍历所有结果，不再拼接出中间列表
+    for result in chain(api_responses, database_results, file_results, tool_results.values()):
+        total_results += 1
         if result.get("status") == "success":
             successful_tools.append(result.get("source", "unknown"))
         else:
@@ -892,17 +1263,17 @@ def combine_results(state: ToolState) -> ToolState:
     
     combined_output = {
         "summary": {
-            "total_tools_executed": len(all_results),
+            "total_tools_executed": total_results,
             "successful_tools": len(successful_tools),
             "failed_tools": len(failed_tools),
-            "success_rate": len(successful_tools) / len(all_results) if all_results else 0
+            "success_rate": len(successful_tools) / total_results if total_results else 0
         },
         "successful_tools": successful_tools,
         "failed_tools": failed_tools,
         "detailed_results": {
-            "api_responses": api_responses,
-            "database_results": database_results,
-            "file_results": file_results,
+            "api_responses": list(api_responses),
+            "database_results": list(database_results),
+            "file_results": list(file_results),
             "llm_results": tool_results.get("llm_result", {})
         },
         "execution_statistics": {
@@ -912,10 +1283,10 @@ def combine_results(state: ToolState) -> ToolState:
         }
     }
     
-    print_result(f"结果合并完成")
-    print(f"  - 成功工具: {len(successful_tools)}")
-    print(f"  - 失败工具: {len(failed_tools)}")
-    print(f"  - 成功率: {combined_output['summary']['success_rate']:.1%}")
+    logger.info("结果合并完成")
+    logger.info("  - 成功工具: %s", len(successful_tools))
+    logger.info("  - 失败工具: %s", len(failed_tools))
+    logger.info("  - 成功率: %.1f%%", combined_output["summary"]["success_rate"] * 100)
     
     return {
         "combined_output": combined_output
@@ -936,15 +1307,14 @@ def build_tool_integration_workflow():
     workflow.add_node("execute_llm_tools", llm_tool_execution)
     workflow.add_node("combine_results", combine_results)
     
-    # 设置入口点
-    workflow.set_entry_point("execute_api_tools")
-    
-    # 并行执行所有工具
-    workflow.add_edge("execute_api_tools", "execute_database_tools")
-    workflow.add_edge("execute_api_tools", "execute_file_tools")
-    workflow.add_edge("execute_api_tools", "execute_llm_tools")
+    # 四个工具节点之间没有数据依赖，从入口同时并行执行
+    workflow.add_edge(START, "execute_api_tools")
+    workflow.add_edge(START, "execute_database_tools")
+    workflow.add_edge(START, "execute_file_tools")
+    workflow.add_edge(START, "execute_llm_tools")
     
     # 等待所有工具执行完成后合并结果
+    workflow.add_edge("execute_api_tools", "combine_results")
     workflow.add_edge("execute_database_tools", "combine_results")
     workflow.add_edge("execute_file_tools", "combine_results")
     workflow.add_edge("execute_llm_tools", "combine_results")
@@ -953,13 +1323,18 @@ def build_tool_integration_workflow():
     
     return workflow.compile()
 
+@cache
+def compiled_tool_app():
+    """获取编译好的工作流，只在首次调用时构建和编译"""
+    return build_tool_integration_workflow()
+
 # 7. 演示函数
 
 def demo_api_tools():
     """演示API工具"""
     print_step("API工具演示")
     
-    tool_manager = ToolManager()
+    tool_manager = get_tool_manager()
     
     # 测试天气API
     print("\n测试天气API工具:")
@@ -977,14 +1352,14 @@ def demo_database_tools():
     """演示数据库工具"""
     print_step("数据库工具演示")
     
-    tool_manager = ToolManager()
+    tool_manager = get_tool_manager()
     
     # 测试数据库查询
     print("\n测试数据库查询:")
     result = tool_manager.execute_tool("database_tool", {
         "operation": "query",
         "table": "products",
-        "condition": "price > 500"
+        "where": {"price": (">", 500)}
     })
     
     if result.get("status") == "success":
@@ -999,7 +1374,7 @@ def demo_file_tools():
     """演示文件工具"""
     print_step("文件工具演示")
     
-    tool_manager = ToolManager()
+    tool_manager = get_tool_manager()
     
     # 创建文件
     print("\n创建示例文件:")
@@ -1031,7 +1406,7 @@ def demo_complete_tool_workflow():
     """演示完整的工具工作流"""
     print_step("完整工具工作流演示")
     
-    app = build_tool_integration_workflow()
+    app = compiled_tool_app()
     
     initial_state = {
         "task_type": "multi_tool_demo",
@@ -1040,7 +1415,7 @@ def demo_complete_tool_workflow():
             "city": "深圳",
             "query_database": True,
             "table": "products",
-            "condition": "category = '电子产品'",
+            "where": {"category": "电子产品"},
             "create_sample_file": True,
             "analyze_file": True,
             "use_llm": True,
@@ -1059,7 +1434,7 @@ def demo_complete_tool_workflow():
     print("开始执行完整工具工作流...")
     
     start_time = time.time()
-    result = app.invoke(initial_state)
+    result = asyncio.run(app.ainvoke(initial_state))
     end_time = time.time()
     
     print_result(f"工作流执行完成，总耗时: {end_time - start_time:.2f}s")
@@ -1074,8 +1449,8 @@ def demo_complete_tool_workflow():
     print(f"  失败工具: {summary.get('failed_tools', 0)}")
     print(f"  成功率: {summary.get('success_rate', 0):.1%}")
     
-    # 显示工具列表
-    tool_manager = ToolManager()
+    # 显示工具列表（与工作流节点共享同一个管理器，执行次数才准确）
+    tool_manager = get_tool_manager()
     tools = tool_manager.list_tools()
     
     print(f"\n可用工具:")
@@ -1084,6 +1459,17 @@ def demo_complete_tool_workflow():
 
 # 主程序
 if __name__ == "__main__":
+    # 交互运行时输出节点的进度信息
+    logging.basicConfig(format="%(message)s")
+    logger.setLevel(logging.INFO)
+    
+    demos = {
+        "1": demo_api_tools,
+        "2": demo_database_tools,
+        "3": demo_file_tools,
+        "4": demo_complete_tool_workflow
+    }
+    
     print("🔧 LangGraph 自定义工具学习程序")
     print("=" * 60)
     
@@ -1097,14 +1483,8 @@ if __name__ == "__main__":
         
         choice = input("\n请输入选择 (0-4): ").strip()
         
-        if choice == "1":
-            demo_api_tools()
-        elif choice == "2":
-            demo_database_tools()
-        elif choice == "3":
-            demo_file_tools()
-        elif choice == "4":
-            demo_complete_tool_workflow()
+        if choice in demos:
+            demos[choice]()
         elif choice == "0":
             print_step("感谢学习自定义工具！")
             break
@@ -11,33 +11,96 @@
 4. 错误恢复策略
 """
 
-from typing import TypedDict, List, Dict, Any, Optional, Callable
+from typing import Annotated, TypedDict, List, Dict, Deque, Any, Optional, Callable, Literal
 from langgraph.graph import StateGraph, END
 import sys
 import os
 import time
-import random
+import asyncio
+import operator
+import threading
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from enum import Enum
-from functools import wraps
-import json
+from collections import deque, Counter
+from itertools import islice
+from functools import wraps, cache
+import orjson
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
 
 # 添加父目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import print_step, print_result, print_error
+from utils import print_step, print_result, print_error, append_bounded
+
+# 时间戳工具：状态中只保存纳秒整数，打印或序列化时才格式化为 ISO 字符串
+_TIMESTAMP_KEYS = frozenset({
+    "timestamp", "preprocessing_timestamp", "processing_timestamp",
+    "last_used", "final_timestamp"
+})
+
+def _ts() -> int:
+    """当前时间（纳秒整数）"""
+    return time.time_ns()
+
+def _iso(ns: int) -> str:
+    """把 _ts() 的读数格式化为 ISO 字符串"""
+    return datetime.fromtimestamp(ns / 1_000_000_000).isoformat()
+
+def render_timestamps(obj: Any) -> Any:
+    """返回 obj 的副本，其中的时间字段被格式化为 ISO 字符串，供打印和序列化使用"""
+    if isinstance(obj, dict):
+        return {
+            key: _iso(value) if key in _TIMESTAMP_KEYS and isinstance(value, int) else render_timestamps(value)
+            for key, value in obj.items()
+        }
+    if isinstance(obj, tuple):
+        return tuple(render_timestamps(item) for item in obj)
+    if isinstance(obj, (list, deque)):
+        return [render_timestamps(item) for item in obj]  # deque 转为列表，便于 orjson 序列化
+    return obj
+
+# 随机数工具：每个线程持有独立的生成器，批量预生成随机数后逐个取用
+_RAND_BATCH_SIZE = 4096
+_rand_local = threading.local()
+
+def _rand() -> float:
+    """返回 [0, 1) 区间的随机数"""
+    local = _rand_local
+    index = getattr(local, "index", _RAND_BATCH_SIZE)
+    if index == _RAND_BATCH_SIZE:
+        if not hasattr(local, "rng"):
+            local.rng = np.random.default_rng()
+        local.batch = local.rng.random(_RAND_BATCH_SIZE).tolist()
+        index = 0
+    local.index = index + 1
+    return local.batch[index]
+
+def _uniform(low: float, high: float) -> float:
+    """返回 [low, high) 区间的随机数"""
+    return low + (high - low) * _rand()
 
 # 1. 错误处理状态定义
+
+# 状态中保留的最近错误条数
+ERROR_HISTORY_SIZE = 256
+
 class ErrorHandlingState(TypedDict):
     """
     错误处理工作流状态
+    
+    task_data 和 fallback_data 按键合并，节点只需返回新增或变化的字段
     """
-    task_data: Dict[str, Any]
+    task_data: Annotated[Dict[str, Any], operator.or_]
     current_step: str
-    error_history: List[Dict[str, Any]]
+    # 只保留最近的错误明细，累计错误数单独计数
+    error_history: Annotated[Deque[Dict[str, Any]], append_bounded(ERROR_HISTORY_SIZE)]
+    total_errors_seen: Annotated[int, operator.add]
     retry_count: int
     circuit_breaker_status: Dict[str, Any]
-    fallback_data: Dict[str, Any]
+    fallback_data: Annotated[Dict[str, Any], operator.or_]
     final_result: Dict[str, Any]
     error_stats: Dict[str, Any]
 
@@ -47,130 +110,299 @@ class CircuitState(Enum):
     OPEN = "open"          # 断路状态
     HALF_OPEN = "half_open"  # 半开状态
 
+class CircuitBreakerOpen(Exception):
+    """断路器处于 OPEN 状态，调用被直接拒绝"""
+
+# 单调时钟与墙上时钟的对应关系，在导入时记录一次，用于把单调时间戳换算为可读时间
+_WALL_ANCHOR = time.time()
+_MONOTONIC_ANCHOR_NS = time.monotonic_ns()
+
+def _monotonic_to_iso(monotonic_ns: int) -> str:
+    """把 time.monotonic_ns() 的读数换算为 ISO 格式的本地时间"""
+    return datetime.fromtimestamp(
+        _WALL_ANCHOR + (monotonic_ns - _MONOTONIC_ANCHOR_NS) / 1_000_000_000
+    ).isoformat()
+
+# 断路器状态在状态表中的编码
+_CLOSED, _OPEN, _HALF_OPEN = 0, 1, 2
+_STATE_BY_CODE = (CircuitState.CLOSED, CircuitState.OPEN, CircuitState.HALF_OPEN)
+
+class CircuitBreakerTable:
+    """
+    断路器状态表
+    
+    以结构数组（SoA）的形式保存所有服务的断路器状态：每一列是一个连续的 numpy 数组，
+    按服务编号索引。单个断路器的热路径只读写对应下标，
+    而 "哪些断路器可以从 OPEN 进入 HALF_OPEN" 这类批量检查只需一次向量化比较。
+    所有状态迁移都在锁内完成，并发失败不会漏掉 OPEN 切换；
+    每次变更都会递增 version，便于调用方判断缓存的状态快照是否过期。
+    """
+    
+    def __init__(self, capacity: int = 8):
+        self._id: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        self.state = np.zeros(capacity, dtype=np.int8)
+        self.failure_count = np.zeros(capacity, dtype=np.int64)
+        self.last_failure_ns = np.zeros(capacity, dtype=np.int64)
+        self.threshold = np.zeros(capacity, dtype=np.int64)
+        self.recovery_ns = np.zeros(capacity, dtype=np.int64)
+    
+    def register(self, service_name: str, failure_threshold: int, recovery_timeout: float) -> int:
+        """登记服务并返回其编号，已登记的服务直接返回原编号"""
+        with self._lock:
+            index = self._id.get(service_name)
+            if index is not None:
+                return index
+            
+            index = len(self._id)
+            if index == len(self.state):
+                self._grow(2 * index)
+            self._id[service_name] = index
+            self.threshold[index] = failure_threshold
+            self.recovery_ns[index] = int(recovery_timeout * 1_000_000_000)
+            self.version += 1
+            return index
+    
+    def _grow(self, capacity: int):
+        """扩容所有列，新增部分清零"""
+        for column in ("state", "failure_count", "last_failure_ns", "threshold", "recovery_ns"):
+            old = getattr(self, column)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, column, new)
+    
+    def try_half_open(self, index: int) -> bool:
+        """OPEN 状态下检查是否已度过恢复等待期，是则切换为 HALF_OPEN 并放行"""
+        with self._lock:
+            if self.state[index] != _OPEN:
+                return True
+            last = self.last_failure_ns[index]
+            if last == 0 or time.monotonic_ns() - last < self.recovery_ns[index]:
+                return False
+            self.state[index] = _HALF_OPEN
+            self.version += 1
+            return True
+    
+    def on_success(self, index: int):
+        """成功时的处理"""
+        with self._lock:
+            if self.failure_count[index] or self.state[index] != _CLOSED:
+                self.failure_count[index] = 0
+                self.state[index] = _CLOSED
+                self.version += 1
+    
+    def on_failure(self, index: int):
+        """失败时的处理"""
+        with self._lock:
+            self.failure_count[index] += 1
+            self.last_failure_ns[index] = time.monotonic_ns()
+            if self.failure_count[index] >= self.threshold[index]:
+                self.state[index] = _OPEN
+            self.version += 1
+    
+    def sweep(self) -> List[str]:
+        """将所有已度过恢复等待期的 OPEN 断路器切换为 HALF_OPEN，返回被切换的服务名"""
+        with self._lock:
+            size = len(self._id)
+            now_ns = time.monotonic_ns()
+            ready = (self.state[:size] == _OPEN) & (now_ns - self.last_failure_ns[:size] >= self.recovery_ns[:size])
+            if not ready.any():
+                return []
+            
+            self.state[:size][ready] = _HALF_OPEN
+            self.version += 1
+            names = list(self._id)
+        return [names[i] for i in np.flatnonzero(ready)]
+
 class CircuitBreaker:
     """
     断路器实现
+    
+    断路器本身只持有状态表和自己的编号，状态数据保存在 CircuitBreakerTable 中；
+    未指定状态表时使用一张独立的单行表。
     """
     
-    def __init__(self, failure_threshold: int = 3, recovery_timeout: int = 60):
+    def __init__(self, failure_threshold: int = 3, recovery_timeout: float = 60,
+                 table: Optional[CircuitBreakerTable] = None, service_name: str = "default"):
         self.failure_threshold = failure_threshold
         self.recovery_timeout = recovery_timeout
-        self.failure_count = 0
-        self.state = CircuitState.CLOSED
-        self.last_failure_time = None
+        self._table = table if table is not None else CircuitBreakerTable(capacity=1)
+        self._index = self._table.register(service_name, failure_threshold, recovery_timeout)
+    
+    @property
+    def state(self) -> CircuitState:
+        return _STATE_BY_CODE[self._table.state[self._index]]
+    
+    @property
+    def failure_count(self) -> int:
+        return int(self._table.failure_count[self._index])
+    
+    def _before_call(self):
+        """调用前检查断路器是否放行，CLOSED 状态无需加锁直接放行"""
+        table, index = self._table, self._index
+        if table.state[index] == _OPEN and not table.try_half_open(index):
+            raise CircuitBreakerOpen("Circuit breaker is OPEN")
     
     def call(self, func: Callable, *args, **kwargs):
         """调用受保护的函数"""
-        if self.state == CircuitState.OPEN:
-            if self._should_attempt_reset():
-                self.state = CircuitState.HALF_OPEN
-            else:
-                raise Exception("Circuit breaker is OPEN")
+        self._before_call()
         
         try:
             result = func(*args, **kwargs)
-            self._on_success()
+            self._table.on_success(self._index)
             return result
         except Exception as e:
-            self._on_failure()
+            self._table.on_failure(self._index)
             raise e
     
-    def _should_attempt_reset(self) -> bool:
-        """是否应该尝试重置断路器"""
-        if self.last_failure_time is None:
-            return False
-        return (datetime.now() - self.last_failure_time).seconds >= self.recovery_timeout
-    
-    def _on_success(self):
-        """成功时的处理"""
-        self.failure_count = 0
-        self.state = CircuitState.CLOSED
-    
-    def _on_failure(self):
-        """失败时的处理"""
-        self.failure_count += 1
-        self.last_failure_time = datetime.now()
+    async def acall(self, func: Callable, *args, **kwargs):
+        """调用受保护的异步函数"""
+        self._before_call()
         
-        if self.failure_count >= self.failure_threshold:
-            self.state = CircuitState.OPEN
+        try:
+            result = await func(*args, **kwargs)
+            self._table.on_success(self._index)
+            return result
+        except Exception as e:
+            self._table.on_failure(self._index)
+            raise e
     
     def get_status(self) -> Dict[str, Any]:
         """获取断路器状态"""
+        last_failure_ns = int(self._table.last_failure_ns[self._index])
         return {
             "state": self.state.value,
             "failure_count": self.failure_count,
-            "last_failure_time": self.last_failure_time.isoformat() if self.last_failure_time else None,
+            "last_failure_time": _monotonic_to_iso(last_failure_ns) if last_failure_ns else None,
             "threshold": self.failure_threshold,
             "recovery_timeout": self.recovery_timeout
         }
 
 # 2. 重试装饰器和工具
 
-def retry(max_attempts: int = 3, delay: float = 1.0, backoff: float = 2.0, 
-          exceptions: tuple = (Exception,)):
+def retry(max_attempts: int = 3, delay: float = 1.0, backoff: float = 2.0,
+          jitter: float = 0.1, max_delay: float = 30.0,
+          exceptions: tuple = (Exception,),
+          on_backoff: Optional[Callable[[float, int], None]] = None,
+          on_exhausted: Optional[Callable[[], None]] = None,
+          retry_on: Optional[Callable[[Exception, int], bool]] = None):
     """
     重试装饰器
-    """
+    
+    同时支持同步函数和异步函数，异步函数在等待时使用 asyncio.sleep，不阻塞事件循环。
+    等待时间按指数退避计算（不超过 max_delay），并叠加 ±jitter 比例的随机抖动，
+    避免大量调用方同时失败后在同一时刻集中重试。
+    on_backoff(wait_time, attempt) 在每次等待前调用，on_exhausted() 在重试耗尽时调用。
+    retry_on(exception, attempt) 返回 False 时不再重试、直接抛出；
+    默认遇到 CircuitBreakerOpen 立即放弃，断路器已打开时重试只会白白等待。
+    """
+    if retry_on is None:
+        retry_on = lambda e, attempt: not isinstance(e, CircuitBreakerOpen)
+    
+    def next_wait(attempt: int) -> Optional[float]:
+        """计算下一次重试前的等待时间，重试次数耗尽时返回 None"""
+        if attempt >= max_attempts - 1:
+            logger.warning("重试 %s 次后仍然失败", max_attempts)
+            if on_exhausted:
+                on_exhausted()
+            return None
+        
+        wait_time = min(max_delay, delay * (backoff ** attempt))
+        wait_time *= 1 + _uniform(-jitter, jitter)
+        logger.warning("重试第 %s 次，等待 %.1fs 后继续...", attempt + 1, wait_time)
+        if on_backoff:
+            on_backoff(wait_time, attempt)
+        return wait_time
+    
     def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                for attempt in range(max_attempts):
+                    try:
+                        return await func(*args, **kwargs)
+                    except exceptions as e:
+                        if not retry_on(e, attempt):
+                            raise
+                        wait_time = next_wait(attempt)
+                        if wait_time is None:
+                            raise
+                        await asyncio.sleep(wait_time)
+            return async_wrapper
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
-            last_exception = None
-            
             for attempt in range(max_attempts):
                 try:
                     return func(*args, **kwargs)
                 except exceptions as e:
-                    last_exception = e
-                    if attempt < max_attempts - 1:
-                        wait_time = delay * (backoff ** attempt)
-                        print(f"重试第 {attempt + 1} 次，等待 {wait_time:.1f}s 后继续...")
-                        time.sleep(wait_time)
-                    else:
-                        print(f"重试 {max_attempts} 次后仍然失败")
-            
-            raise last_exception
+                    if not retry_on(e, attempt):
+                        raise
+                    wait_time = next_wait(attempt)
+                    if wait_time is None:
+                        raise
+                    time.sleep(wait_time)
         return wrapper
     return decorator
 
+# 错误日志保留的最近错误条数
+ERROR_LOG_SIZE = 1024
+
 class ErrorHandler:
     """
     错误处理器
     """
     
     def __init__(self):
+        self.breaker_table = CircuitBreakerTable()
         self.circuit_breakers = {}
-        self.error_log = []
+        # 只保留最近的错误明细，按类型的累计计数单独维护，统计时无需重新扫描
+        self.error_log = deque(maxlen=ERROR_LOG_SIZE)
+        self.error_type_counts = Counter()
+        # 断路器状态快照及其对应的状态表版本
+        self._status_snapshot: Dict[str, Dict[str, Any]] = {}
+        self._status_version = -1
     
     def get_circuit_breaker(self, service_name: str) -> CircuitBreaker:
         """获取或创建断路器"""
         if service_name not in self.circuit_breakers:
-            self.circuit_breakers[service_name] = CircuitBreaker()
+            self.circuit_breakers[service_name] = CircuitBreaker(
+                table=self.breaker_table, service_name=service_name
+            )
         return self.circuit_breakers[service_name]
     
+    def snapshot_status(self) -> Dict[str, Dict[str, Any]]:
+        """获取所有断路器的状态快照，状态表未变化时直接复用上一次的快照"""
+        version = self.breaker_table.version
+        if version != self._status_version:
+            self._status_snapshot = {
+                service_name: circuit_breaker.get_status()
+                for service_name, circuit_breaker in self.circuit_breakers.items()
+            }
+            self._status_version = version
+        return self._status_snapshot
+    
     def log_error(self, error: Exception, context: Dict[str, Any] = None):
         """记录错误"""
         error_entry = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": _ts(),
             "error_type": type(error).__name__,
             "error_message": str(error),
             "context": context or {}
         }
         self.error_log.append(error_entry)
+        self.error_type_counts[error_entry["error_type"]] += 1
     
     def get_error_stats(self) -> Dict[str, Any]:
         """获取错误统计"""
-        if not self.error_log:
+        if not self.error_type_counts:
             return {"total_errors": 0}
         
-        error_types = {}
-        for error in self.error_log:
-            error_type = error["error_type"]
-            error_types[error_type] = error_types.get(error_type, 0) + 1
-        
         return {
-            "total_errors": len(self.error_log),
-            "error_types": error_types,
-            "recent_errors": [error for error in self.error_log[-5:]]
+            "total_errors": sum(self.error_type_counts.values()),
+            "error_types": dict(self.error_type_counts),
+            "recent_errors": list(islice(self.error_log, max(0, len(self.error_log) - 5), None))
         }
 
 # 全局错误处理器
@@ -179,45 +411,45 @@ error_handler = ErrorHandler()
 # 3. 模拟外部服务和处理节点
 
 @retry(max_attempts=3, delay=1.0, backoff=2.0)
-def unreliable_service_call(data: Dict[str, Any]) -> Dict[str, Any]:
+async def unreliable_service_call(data: Dict[str, Any]) -> Dict[str, Any]:
     """
     模拟不可靠的服务调用
     """
     # 模拟失败率
-    if random.random() < 0.3:  # 30% 失败率
+    if _rand() < 0.3:  # 30% 失败率
         raise Exception("服务暂时不可用")
     
     # 模拟处理延迟
-    time.sleep(random.uniform(0.5, 2.0))
+    await asyncio.sleep(_uniform(0.5, 2.0))
     
     return {
         "status": "success",
         "processed_data": data,
-        "processing_time": random.uniform(0.5, 2.0),
-        "timestamp": datetime.now().isoformat()
+        "processing_time": _uniform(0.5, 2.0),
+        "timestamp": _ts()
     }
 
-def circuit_breaker_service_call(service_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
+async def circuit_breaker_service_call(service_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
     """
     使用断路器的服务调用
     """
     circuit_breaker = error_handler.get_circuit_breaker(service_name)
     
-    def call_service():
+    async def call_service():
         # 模拟服务调用
-        if random.random() < 0.4:  # 40% 失败率
+        if _rand() < 0.4:  # 40% 失败率
             raise Exception(f"服务 {service_name} 调用失败")
         
-        time.sleep(random.uniform(0.3, 1.5))
+        await asyncio.sleep(_uniform(0.3, 1.5))
         return {
             "service": service_name,
             "status": "success",
             "data": data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _ts()
         }
     
     try:
-        result = circuit_breaker.call(call_service)
+        result = await circuit_breaker.acall(call_service)
         return result
     except Exception as e:
         error_handler.log_error(e, {"service": service_name, "data": data})
@@ -229,27 +461,22 @@ def data_preprocessing(state: ErrorHandlingState) -> ErrorHandlingState:
     """
     数据预处理节点
     """
-    print_step("数据预处理")
+    logger.info("数据预处理")
     
     task_data = state.get("task_data", {})
-    error_history = state.get("error_history", [])
     
     try:
         # 验证数据
         if not task_data.get("input"):
             raise ValueError("输入数据为空")
         
-        # 模拟处理
-        processed_data = {
-            **task_data,
-            "preprocessed": True,
-            "preprocessing_timestamp": datetime.now().isoformat()
-        }
-        
-        print_result("数据预处理完成")
+        logger.info("数据预处理完成")
         
         return {
-            "task_data": processed_data,
+            "task_data": {
+                "preprocessed": True,
+                "preprocessing_timestamp": _ts()
+            },
             "current_step": "preprocessing"
         }
         
@@ -257,104 +484,96 @@ def data_preprocessing(state: ErrorHandlingState) -> ErrorHandlingState:
         error_entry = {
             "step": "preprocessing",
             "error": str(e),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _ts()
         }
-        error_history.append(error_entry)
         error_handler.log_error(e, {"step": "preprocessing", "data": task_data})
         
-        print_error(f"数据预处理失败: {e}")
+        logger.error("数据预处理失败: %s", e)
         
         return {
-            "error_history": error_history,
+            "error_history": [error_entry],
+            "total_errors_seen": 1,
             "current_step": "preprocessing_error"
         }
 
-def primary_processing(state: ErrorHandlingState) -> ErrorHandlingState:
+async def primary_processing(state: ErrorHandlingState) -> ErrorHandlingState:
     """
     主要处理节点
     """
-    print_step("主要处理")
+    logger.info("主要处理")
     
     task_data = state.get("task_data", {})
-    error_history = state.get("error_history", [])
     retry_count = state.get("retry_count", 0)
     
     try:
         # 使用重试机制的服务调用
-        result = unreliable_service_call(task_data)
+        result = await unreliable_service_call(task_data)
         
-        processed_data = {
-            **task_data,
-            "primary_result": result,
-            "processing_timestamp": datetime.now().isoformat()
-        }
-        
-        print_result("主要处理完成")
+        logger.info("主要处理完成")
         
         return {
-            "task_data": processed_data,
+            "task_data": {
+                "primary_result": result,
+                "processing_timestamp": _ts()
+            },
             "current_step": "primary_processing",
             "retry_count": 0  # 重置重试计数
         }
         
     except Exception as e:
-        print_error(f"主要处理失败: {e}")
+        logger.error("主要处理失败: %s", e)
         
         error_entry = {
             "step": "primary_processing",
             "error": str(e),
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": _ts(),
             "retry_count": retry_count
         }
-        error_history.append(error_entry)
         error_handler.log_error(e, {"step": "primary_processing", "retry_count": retry_count})
         
         return {
-            "error_history": error_history,
+            "error_history": [error_entry],
+            "total_errors_seen": 1,
             "current_step": "primary_processing_error",
             "retry_count": retry_count + 1
         }
 
-def secondary_processing(state: ErrorHandlingState) -> ErrorHandlingState:
+async def secondary_processing(state: ErrorHandlingState) -> ErrorHandlingState:
     """
     备用处理节点
     """
-    print_step("备用处理")
+    logger.info("备用处理")
     
     task_data = state.get("task_data", {})
-    error_history = state.get("error_history", [])
     
     try:
         # 使用断路器保护的服务调用
-        result = circuit_breaker_service_call("secondary_service", task_data)
-        
-        processed_data = {
-            **task_data,
-            "secondary_result": result,
-            "processing_timestamp": datetime.now().isoformat(),
-            "processing_mode": "fallback"
-        }
+        result = await circuit_breaker_service_call("secondary_service", task_data)
         
-        print_result("备用处理完成")
+        logger.info("备用处理完成")
         
         return {
-            "task_data": processed_data,
+            "task_data": {
+                "secondary_result": result,
+                "processing_timestamp": _ts(),
+                "processing_mode": "fallback"
+            },
             "current_step": "secondary_processing"
         }
         
     except Exception as e:
-        print_error(f"备用处理失败: {e}")
+        logger.error("备用处理失败: %s", e)
         
         error_entry = {
             "step": "secondary_processing",
             "error": str(e),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _ts()
         }
-        error_history.append(error_entry)
         error_handler.log_error(e, {"step": "secondary_processing"})
         
         return {
-            "error_history": error_history,
+            "error_history": [error_entry],
+            "total_errors_seen": 1,
             "current_step": "secondary_processing_error"
         }
 
@@ -362,9 +581,8 @@ def fallback_processing(state: ErrorHandlingState) -> ErrorHandlingState:
     """
     降级处理节点
     """
-    print_step("降级处理")
+    logger.info("降级处理")
     
-    task_data = state.get("task_data", {})
     fallback_data = state.get("fallback_data", {})
     
     # 提供基本的降级服务
@@ -373,28 +591,21 @@ def fallback_processing(state: ErrorHandlingState) -> ErrorHandlingState:
         "message": "使用降级服务",
         "basic_functionality": True,
         "limited_features": True,
-        "timestamp": datetime.now().isoformat()
-    }
-    
-    processed_data = {
-        **task_data,
-        "fallback_result": basic_result,
-        "processing_mode": "degraded",
-        "timestamp": datetime.now().isoformat()
-    }
-    
-    # 更新降级数据
-    new_fallback_data = {
-        **fallback_data,
-        "last_used": datetime.now().isoformat(),
-        "usage_count": fallback_data.get("usage_count", 0) + 1
+        "timestamp": _ts()
     }
     
-    print_result("降级处理完成")
+    logger.info("降级处理完成")
     
     return {
-        "task_data": processed_data,
-        "fallback_data": new_fallback_data,
+        "task_data": {
+            "fallback_result": basic_result,
+            "processing_mode": "degraded",
+            "timestamp": _ts()
+        },
+        "fallback_data": {
+            "last_used": _ts(),
+            "usage_count": fallback_data.get("usage_count", 0) + 1
+        },
         "current_step": "fallback_processing"
     }
 
@@ -402,22 +613,19 @@ def error_analysis(state: ErrorHandlingState) -> ErrorHandlingState:
     """
     错误分析节点
     """
-    print_step("错误分析")
+    logger.info("错误分析")
     
-    error_history = state.get("error_history", [])
-    circuit_breaker_status = {}
-    
-    # 收集所有断路器状态
-    for service_name, circuit_breaker in error_handler.circuit_breakers.items():
-        circuit_breaker_status[service_name] = circuit_breaker.get_status()
+    # 一次向量化扫描推进所有可恢复的断路器，再取状态快照
+    error_handler.breaker_table.sweep()
+    circuit_breaker_status = error_handler.snapshot_status()
     
     # 分析错误模式
     error_stats = error_handler.get_error_stats()
     
-    print(f"错误分析完成:")
-    print(f"  - 总错误数: {error_stats.get('total_errors', 0)}")
-    print(f"  - 错误类型: {error_stats.get('error_types', {})}")
-    print(f"  - 断路器状态: {list(circuit_breaker_status.keys())}")
+    logger.info("错误分析完成:")
+    logger.info("  - 总错误数: %s", error_stats.get("total_errors", 0))
+    logger.info("  - 错误类型: %s", error_stats.get("error_types", {}))
+    logger.info("  - 断路器状态: %s", list(circuit_breaker_status.keys()))
     
     return {
         "circuit_breaker_status": circuit_breaker_status,
@@ -429,9 +637,9 @@ def recovery_strategy(state: ErrorHandlingState) -> ErrorHandlingState:
     """
     恢复策略节点
     """
-    print_step("执行恢复策略")
+    logger.info("执行恢复策略")
     
-    error_history = state.get("error_history", [])
+    total_errors_seen = state.get("total_errors_seen", 0)
     retry_count = state.get("retry_count", 0)
     current_step = state.get("current_step", "")
     
@@ -439,70 +647,65 @@ def recovery_strategy(state: ErrorHandlingState) -> ErrorHandlingState:
     if current_step == "primary_processing_error" and retry_count < 3:
         recovery_action = "retry_primary"
         message = "将重试主要处理"
-    elif len(error_history) > 5:
+    elif total_errors_seen > 5:
         recovery_action = "use_secondary"
         message = "错误过多，切换到备用处理"
     else:
         recovery_action = "use_fallback"
         message = "使用降级处理"
     
-    print(f"恢复策略: {message}")
+    logger.info("恢复策略: %s", message)
     
     return {
-        "current_step": f"recovery_{recovery_action}"
+        "current_step": f"recovery:{recovery_action}"
     }
 
+# 最终结果的来源优先级：(task_data 中的结果键, 处理模式, 结果状态)
+RESULT_TABLE = (
+    ("primary_result", "primary", "success"),
+    ("secondary_result", "secondary", "success"),
+    ("fallback_result", "fallback", "degraded")
+)
+
 def final_result_generation(state: ErrorHandlingState) -> ErrorHandlingState:
     """
     最终结果生成节点
     """
-    print_step("生成最终结果")
+    logger.info("生成最终结果")
     
     task_data = state.get("task_data", {})
-    error_history = state.get("error_history", [])
+    total_errors_seen = state.get("total_errors_seen", 0)
     circuit_breaker_status = state.get("circuit_breaker_status", {})
     error_stats = state.get("error_stats", {})
     
-    # 确定最终结果
-    final_result = {}
+    processing_summary = {
+        "total_errors": total_errors_seen,
+        "circuit_breakers": list(circuit_breaker_status.keys()),
+        "error_types": error_stats.get("error_types", {}),
+        "final_timestamp": _ts()
+    }
     
-    if "primary_result" in task_data:
-        final_result = {
-            "status": "success",
-            "processing_mode": "primary",
-            "result": task_data["primary_result"]
-        }
-    elif "secondary_result" in task_data:
-        final_result = {
-            "status": "success",
-            "processing_mode": "secondary",
-            "result": task_data["secondary_result"]
-        }
-    elif "fallback_result" in task_data:
-        final_result = {
-            "status": "degraded",
-            "processing_mode": "fallback",
-            "result": task_data["fallback_result"]
-        }
+    # 按优先级取第一个存在的处理结果
+    for result_key, processing_mode, status in RESULT_TABLE:
+        if result_key in task_data:
+            final_result = {
+                "status": status,
+                "processing_mode": processing_mode,
+                "result": task_data[result_key],
+                "processing_summary": processing_summary
+            }
+            break
     else:
         final_result = {
             "status": "failed",
             "error": "所有处理方式都失败",
-            "error_count": len(error_history)
+            "error_count": total_errors_seen,
+            "processing_summary": processing_summary
         }
     
-    final_result.update({
-        "processing_summary": {
-            "total_errors": len(error_history),
-            "circuit_breakers": list(circuit_breaker_status.keys()),
-            "error_types": error_stats.get("error_types", {}),
-            "final_timestamp": datetime.now().isoformat()
-        }
-    })
-    
-    print_result("最终结果生成完成")
-    print(f"处理状态: {final_result['status']}")
-    print(f"处理模式: {final_result.get('processing_mode', 'unknown')}")
+    logger.info("最终结果生成完成")
+    logger.info("处理状态: %s", final_result["status"])
+    logger.info("处理模式: %s", final_result.get("processing_mode", "unknown"))
     
     return {
         "final_result": final_result
@@ -510,64 +713,52 @@ def final_result_generation(state: ErrorHandlingState) -> ErrorHandlingState:
 
 # 5. 路由函数
 
+# current_step -> 路由标签，未命中时使用各路由函数中的默认分支
+ROUTE_AFTER_PREPROCESSING = {"preprocessing": "primary"}
+ROUTE_AFTER_PRIMARY = {"primary_processing": "success"}
+ROUTE_AFTER_SECONDARY = {"secondary_processing": "success"}
+ROUTE_AFTER_RECOVERY = {
+    "recovery:retry_primary": "primary",
+    "recovery:use_secondary": "secondary"
+}
+
 def route_after_preprocessing(state: ErrorHandlingState) -> Literal["primary", "error"]:
     """
     预处理后的路由
     """
     current_step = state.get("current_step", "")
-    
-    if current_step == "preprocessing":
-        print("路由: primary (预处理成功)")
-        return "primary"
-    else:
-        print("路由: error (预处理失败)")
-        return "error"
+    route = ROUTE_AFTER_PREPROCESSING.get(current_step, "error")
+    logger.debug("路由: %s -> %s", current_step, route)
+    return route
 
 def route_after_primary(state: ErrorHandlingState) -> Literal["success", "retry", "secondary"]:
     """
     主要处理后的路由
     """
     current_step = state.get("current_step", "")
-    retry_count = state.get("retry_count", 0)
-    
-    if current_step == "primary_processing":
-        print("路由: success (主要处理成功)")
-        return "success"
-    elif retry_count < 3:
-        print("路由: retry (重试主要处理)")
-        return "retry"
-    else:
-        print("路由: secondary (切换到备用处理)")
-        return "secondary"
+    route = ROUTE_AFTER_PRIMARY.get(current_step)
+    if route is None:
+        route = "retry" if state.get("retry_count", 0) < 3 else "secondary"
+    logger.debug("路由: %s -> %s", current_step, route)
+    return route
 
 def route_after_secondary(state: ErrorHandlingState) -> Literal["success", "fallback"]:
     """
     备用处理后的路由
     """
     current_step = state.get("current_step", "")
-    
-    if current_step == "secondary_processing":
-        print("路由: success (备用处理成功)")
-        return "success"
-    else:
-        print("路由: fallback (降级处理)")
-        return "fallback"
+    route = ROUTE_AFTER_SECONDARY.get(current_step, "fallback")
+    logger.debug("路由: %s -> %s", current_step, route)
+    return route
 
 def route_after_recovery(state: ErrorHandlingState) -> Literal["primary", "secondary", "fallback"]:
     """
     恢复策略后的路由
     """
     current_step = state.get("current_step", "")
-    
-    if "retry_primary" in current_step:
-        print("路由: primary (重试主要处理)")
-        return "primary"
-    elif "use_secondary" in current_step:
-        print("路由: secondary (使用备用处理)")
-        return "secondary"
-    else:
-        print("路由: fallback (使用降级处理)")
-        return "fallback"
+    route = ROUTE_AFTER_RECOVERY.get(current_step, "fallback")
+    logger.debug("路由: %s -> %s", current_step, route)
+    return route
 
 # 6. 构建错误处理工作流
 
@@ -634,13 +825,18 @@ def build_error_handling_workflow():
     
     return workflow.compile()
 
+@cache
+def compiled_error_app():
+    """获取编译好的工作流，只在首次调用时构建和编译"""
+    return build_error_handling_workflow()
+
 # 7. 演示函数
 
 def demo_error_handling():
     """演示错误处理"""
     print_step("错误处理演示")
     
-    app = build_error_handling_workflow()
+    app = compiled_error_app()
     
     initial_state = {
         "task_data": {
@@ -649,6 +845,7 @@ def demo_error_handling():
         },
         "current_step": "",
         "error_history": [],
+        "total_errors_seen": 0,
         "retry_count": 0,
         "circuit_breaker_status": {},
         "fallback_data": {},
@@ -659,7 +856,7 @@ def demo_error_handling():
     print("开始错误处理演示...")
     
     start_time = time.time()
-    result = app.invoke(initial_state)
+    result = asyncio.run(app.ainvoke(initial_state))
     end_time = time.time()
     
     print(f"\n执行完成，总耗时: {end_time - start_time:.2f}s")
@@ -667,8 +864,7 @@ def demo_error_handling():
     # 显示最终结果
     final_result = result.get("final_result", {})
     print(f"\n最终结果:")
-    for key, value in final_result.items():
-        print(f"  {key}: {value}")
+    print(orjson.dumps(render_timestamps(final_result), option=orjson.OPT_INDENT_2).decode())
     
     # 显示错误统计
     error_stats = result.get("error_stats", {})
@@ -681,20 +877,23 @@ def demo_circuit_breaker():
     """演示断路器"""
     print_step("断路器演示")
     
-    # 测试断路器
-    for i in range(10):
-        try:
-            result = circuit_breaker_service_call("test_service", {"request": i})
-            print(f"请求 {i+1}: 成功")
-        except Exception as e:
-            print(f"请求 {i+1}: 失败 - {e}")
-        
-        # 显示断路器状态
-        circuit_breaker = error_handler.get_circuit_breaker("test_service")
-        status = circuit_breaker.get_status()
-        print(f"  断路器状态: {status['state']} (失败次数: {status['failure_count']})")
-        
-        time.sleep(0.5)
+    async def run_requests():
+        # 测试断路器
+        for i in range(10):
+            try:
+                result = await circuit_breaker_service_call("test_service", {"request": i})
+                print(f"请求 {i+1}: 成功")
+            except Exception as e:
+                print(f"请求 {i+1}: 失败 - {e}")
+            
+            # 显示断路器状态
+            circuit_breaker = error_handler.get_circuit_breaker("test_service")
+            status = circuit_breaker.get_status()
+            print(f"  断路器状态: {status['state']} (失败次数: {status['failure_count']})")
+            
+            await asyncio.sleep(0.5)
+    
+    asyncio.run(run_requests())
 
 def demo_retry_mechanism():
     """演示重试机制"""
@@ -702,13 +901,23 @@ def demo_retry_mechanism():
     
     try:
         # 这会失败并重试
-        result = unreliable_service_call({"test": "data"})
-        print(f"重试成功: {result}")
+        result = asyncio.run(unreliable_service_call({"test": "data"}))
+        print(f"重试成功: {render_timestamps(result)}")
     except Exception as e:
         print(f"重试失败: {e}")
 
 # 主程序
 if __name__ == "__main__":
+    # 交互运行时输出节点的进度信息
+    logging.basicConfig(format="%(message)s")
+    logger.setLevel(logging.INFO)
+    
+    demos = {
+        "1": demo_error_handling,
+        "2": demo_circuit_breaker,
+        "3": demo_retry_mechanism
+    }
+    
     print("🛡️ LangGraph 错误处理学习程序")
     print("=" * 60)
     
@@ -721,12 +930,8 @@ if __name__ == "__main__":
         
         choice = input("\n请输入选择 (0-3): ").strip()
         
-        if choice == "1":
-            demo_error_handling()
-        elif choice == "2":
-            demo_circuit_breaker()
-        elif choice == "3":
-            demo_retry_mechanism()
+        if choice in demos:
+            demos[choice]()
         elif choice == "0":
             print_step("感谢学习错误处理！")
             break
@@ -11,16 +11,25 @@
 4. 智能遗忘机制
 """
 
-from typing import TypedDict, List, Dict, Any, Optional
+from typing import TypedDict, List, Dict, Deque, Tuple, Any, Optional
 from langgraph.graph import StateGraph, END
 import sys
 import os
 import json
 import time
-import hashlib
 from datetime import datetime, timedelta
 import sqlite3
+import threading
+import weakref
+import queue
 import re
+import numpy as np
+from uuid import uuid4
+from collections import deque, Counter
+from itertools import chain
+from functools import lru_cache
+from pathlib import Path
+from contextlib import contextmanager
 
 # 添加父目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -33,7 +42,7 @@ class MemoryState(TypedDict):
     """
     current_input: str
     short_term_memory: List[Dict[str, Any]]
-    long_term_memory: List[Dict[str, Any]]
+    long_term_memory: Deque[Dict[str, Any]]  # 有界队列，最多 LONG_TERM_MEMORY_SIZE 条
     context_window: List[Dict[str, Any]]
     memory_summary: Dict[str, Any]
     user_id: str
@@ -63,101 +72,254 @@ class MemoryStorage:
     记忆存储系统
     """
     
-    def __init__(self, db_path: str = "memory.db"):
+    # 建立连接后执行的性能调优 PRAGMA
+    CONNECTION_PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000",
+        "PRAGMA cache_size=-20000",
+        "PRAGMA temp_store=MEMORY"
+    )
+    
+    # 写入（或覆盖）一条记忆的语句；使用 UPSERT 保留原有 rowid，
+    # 使全文索引触发器按 UPDATE 同步（INSERT OR REPLACE 的隐式删除不会触发 DELETE 触发器）
+    INSERT_SQL = '''
+        INSERT INTO memories 
+        (id, content, timestamp, importance, tags, user_id, session_id, access_count, last_accessed, embedding)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET
+            content = excluded.content,
+            timestamp = excluded.timestamp,
+            importance = excluded.importance,
+            tags = excluded.tags,
+            user_id = excluded.user_id,
+            session_id = excluded.session_id,
+            access_count = excluded.access_count,
+            last_accessed = excluded.last_accessed,
+            embedding = excluded.embedding
+    '''
+    
+    # 数据库结构版本，记录在 PRAGMA user_version 中
+    SCHEMA_VERSION = 1
+    
+    # 建表语句；全部使用 IF NOT EXISTS，对旧版本创建的数据库同样适用
+    SCHEMA_SQL = '''
+        CREATE TABLE IF NOT EXISTS memories (
+            id TEXT PRIMARY KEY,
+            content TEXT,
+            timestamp TEXT,
+            importance REAL,
+            tags TEXT,
+            user_id TEXT,
+            session_id TEXT,
+            access_count INTEGER,
+            last_accessed TEXT,
+            embedding BLOB
+        );
+        
+        CREATE TABLE IF NOT EXISTS memory_summary (
+            user_id TEXT,
+            session_id TEXT,
+            summary TEXT,
+            timestamp TEXT,
+            PRIMARY KEY (user_id, session_id)
+        );
+        
+        -- 按用户取最重要、最新记忆的复合索引，无需对用户的全部记忆排序
+        CREATE INDEX IF NOT EXISTS idx_mem_user_imp_ts
+        ON memories (user_id, importance DESC, timestamp DESC);
+        
+        -- 记忆内容的全文索引：trigram 分词支持中文等不含空格文本的子串匹配，
+        -- 由触发器与 memories 表保持同步
+        CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(
+            content,
+            content='memories',
+            content_rowid='rowid',
+            tokenize='trigram'
+        );
+        
+        CREATE TRIGGER IF NOT EXISTS memories_fts_insert AFTER INSERT ON memories BEGIN
+            INSERT INTO memories_fts (rowid, content) VALUES (new.rowid, new.content);
+        END;
+        
+        CREATE TRIGGER IF NOT EXISTS memories_fts_delete AFTER DELETE ON memories BEGIN
+            INSERT INTO memories_fts (memories_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+        END;
+        
+        CREATE TRIGGER IF NOT EXISTS memories_fts_update AFTER UPDATE OF content ON memories BEGIN
+            INSERT INTO memories_fts (memories_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+            INSERT INTO memories_fts (rowid, content) VALUES (new.rowid, new.content);
+        END;
+        
+        -- 旧版本创建的数据库已有记忆数据，按现有内容重建全文索引
+        INSERT INTO memories_fts (memories_fts) VALUES ('rebuild');
+    '''
+    
+    def __init__(self, db_path: str = "memory.db", readers: int = 4):
         self.db_path = db_path
+        
+        # 连接池：一个串行化的写连接 + 多个只读连接；WAL 模式下读不阻塞写
+        self._writer = self._connect()
+        self._write_lock = threading.Lock()
         self.init_database()
+        
+        self._read_pool = queue.Queue()
+        for _ in range(readers):
+            self._read_pool.put(self._connect(read_only=True))
+        
+        # 实例被回收或解释器退出时自动关闭全部连接
+        self._finalizer = weakref.finalize(self, self._close_all, self._writer, self._read_pool)
+    
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        """建立数据库连接并应用性能调优 PRAGMA"""
+        if read_only:
+            uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, isolation_level=None, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        
+        for pragma in self.CONNECTION_PRAGMAS:
+            # 只读连接无法切换日志模式，WAL 已由写连接持久化设置
+            if read_only and pragma.startswith("PRAGMA journal_mode"):
+                continue
+            conn.execute(pragma)
+        return conn
+    
+    @staticmethod
+    def _close_all(writer: sqlite3.Connection, read_pool: queue.Queue):
+        """关闭写连接和连接池中的全部只读连接"""
+        while not read_pool.empty():
+            read_pool.get_nowait().close()
+        writer.close()
+    
+    @contextmanager
+    def _reader(self):
+        """从只读连接池借出一个连接，用完归还"""
+        conn = self._read_pool.get()
+        try:
+            yield conn
+        finally:
+            self._read_pool.put(conn)
+    
+    def close(self):
+        """关闭数据库连接"""
+        self._finalizer()
     
     def init_database(self):
-        """初始化数据库"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS memories (
-                id TEXT PRIMARY KEY,
-                content TEXT,
-                timestamp TEXT,
-                importance REAL,
-                tags TEXT,
-                user_id TEXT,
-                session_id TEXT,
-                access_count INTEGER,
-                last_accessed TEXT,
-                embedding TEXT
-            )
-        ''')
+        """初始化数据库：结构已是最新版本时直接跳过，否则在单个事务中建表"""
+        version = self._writer.execute("PRAGMA user_version").fetchone()[0]
+        if version >= self.SCHEMA_VERSION:
+            return
         
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS memory_summary (
-                user_id TEXT,
-                session_id TEXT,
-                summary TEXT,
-                timestamp TEXT,
-                PRIMARY KEY (user_id, session_id)
+        try:
+            self._writer.executescript(
+                f"BEGIN IMMEDIATE;\n{self.SCHEMA_SQL}\n"
+                f"PRAGMA user_version = {self.SCHEMA_VERSION};\nCOMMIT;"
             )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        except Exception:
+            if self._writer.in_transaction:
+                self._writer.execute("ROLLBACK")
+            raise
+    
+    @staticmethod
+    def _to_row(memory_item: MemoryItem) -> tuple:
+        """把记忆项转换为 memories 表的一行"""
+        return (
+            memory_item["id"],
+            memory_item["content"],
+            memory_item["timestamp"],
+            memory_item["importance"],
+            json.dumps(memory_item["tags"]),
+            memory_item["user_id"],
+            memory_item["session_id"],
+            memory_item["access_count"],
+            memory_item["last_accessed"],
+            # 向量以 float32 原始字节存储，省去 JSON 编解码
+            np.asarray(memory_item.get("embedding") or [], dtype=np.float32).tobytes()
+        )
     
     def store_memory(self, memory_item: MemoryItem) -> bool:
         """存储记忆项"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO memories 
-                (id, content, timestamp, importance, tags, user_id, session_id, access_count, last_accessed, embedding)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                memory_item["id"],
-                memory_item["content"],
-                memory_item["timestamp"],
-                memory_item["importance"],
-                json.dumps(memory_item["tags"]),
-                memory_item["user_id"],
-                memory_item["session_id"],
-                memory_item["access_count"],
-                memory_item["last_accessed"],
-                json.dumps(memory_item.get("embedding", []))
-            ))
-            
-            conn.commit()
-            conn.close()
+            with self._write_lock:
+                self._writer.execute(self.INSERT_SQL, self._to_row(memory_item))
             return True
         except Exception as e:
             print(f"存储记忆失败: {e}")
             return False
     
+    def store_many(self, memory_items: List[MemoryItem]) -> bool:
+        """在单个事务中批量存储记忆项"""
+        rows = [self._to_row(memory_item) for memory_item in memory_items]
+        if not rows:
+            return True
+        
+        try:
+            with self._write_lock:
+                self._writer.execute("BEGIN IMMEDIATE")
+                try:
+                    self._writer.executemany(self.INSERT_SQL, rows)
+                    self._writer.execute("COMMIT")
+                except Exception:
+                    self._writer.execute("ROLLBACK")
+                    raise
+            return True
+        except Exception as e:
+            print(f"批量存储记忆失败: {e}")
+            return False
+    
+    @staticmethod
+    def _decode_embedding(value) -> Optional[List[float]]:
+        """把 embedding 列还原为向量；兼容旧版本以 JSON 文本存储的数据"""
+        if not value:
+            return None
+        if isinstance(value, str):
+            return json.loads(value)
+        return np.frombuffer(value, dtype=np.float32).tolist()
+    
+    @staticmethod
+    def _fts_phrase(query: str) -> str:
+        """把查询文本转换为 FTS5 短语查询，转义其中的双引号"""
+        return '"' + query.replace('"', '""') + '"'
+    
     def retrieve_memories(self, user_id: str, query: str = "", limit: int = 10) -> List[MemoryItem]:
         """检索记忆"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            if query:
-                # 简单的关键词搜索
-                cursor.execute('''
-                    SELECT id, content, timestamp, importance, tags, user_id, session_id, 
-                           access_count, last_accessed, embedding
-                    FROM memories 
-                    WHERE user_id = ? AND content LIKE ?
-                    ORDER BY importance DESC, timestamp DESC
-                    LIMIT ?
-                ''', (user_id, f"%{query}%", limit))
-            else:
-                cursor.execute('''
-                    SELECT id, content, timestamp, importance, tags, user_id, session_id,
-                           access_count, last_accessed, embedding
-                    FROM memories 
-                    WHERE user_id = ?
-                    ORDER BY importance DESC, timestamp DESC
-                    LIMIT ?
-                ''', (user_id, limit))
-            
-            rows = cursor.fetchall()
-            conn.close()
+            with self._reader() as conn:
+                cursor = conn.cursor()
+                
+                if len(query) >= 3:
+                    # 通过全文索引做子串匹配，按相关度排序
+                    cursor.execute('''
+                        SELECT m.id, m.content, m.timestamp, m.importance, m.tags, m.user_id, m.session_id,
+                               m.access_count, m.last_accessed, m.embedding
+                        FROM memories_fts
+                        JOIN memories m ON m.rowid = memories_fts.rowid
+                        WHERE memories_fts MATCH ? AND m.user_id = ?
+                        ORDER BY bm25(memories_fts), m.importance DESC, m.timestamp DESC
+                        LIMIT ?
+                    ''', (self._fts_phrase(query), user_id, limit))
+                elif query:
+                    # trigram 索引无法匹配少于 3 个字符的查询，退回到 LIKE 扫描
+                    cursor.execute('''
+                        SELECT id, content, timestamp, importance, tags, user_id, session_id, 
+                               access_count, last_accessed, embedding
+                        FROM memories 
+                        WHERE user_id = ? AND content LIKE ?
+                        ORDER BY importance DESC, timestamp DESC
+                        LIMIT ?
+                    ''', (user_id, f"%{query}%", limit))
+                else:
+                    cursor.execute('''
+                        SELECT id, content, timestamp, importance, tags, user_id, session_id,
+                               access_count, last_accessed, embedding
+                        FROM memories 
+                        WHERE user_id = ?
+                        ORDER BY importance DESC, timestamp DESC
+                        LIMIT ?
+                    ''', (user_id, limit))
+                
+                rows = cursor.fetchall()
             
             memories = []
             for row in rows:
@@ -171,7 +333,7 @@ class MemoryStorage:
                     "session_id": row[6],
                     "access_count": row[7],
                     "last_accessed": row[8],
-                    "embedding": json.loads(row[9]) if row[9] else None
+                    "embedding": self._decode_embedding(row[9])
                 }
                 memories.append(memory)
             
@@ -184,35 +346,150 @@ class MemoryStorage:
     def update_access_count(self, memory_id: str) -> bool:
         """更新访问次数"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE memories 
-                SET access_count = access_count + 1, last_accessed = ?
-                WHERE id = ?
-            ''', (datetime.now().isoformat(), memory_id))
-            
-            conn.commit()
-            conn.close()
+            with self._write_lock:
+                self._writer.execute('''
+                    UPDATE memories 
+                    SET access_count = access_count + 1, last_accessed = ?
+                    WHERE id = ?
+                ''', (datetime.now().isoformat(), memory_id))
             return True
         except Exception as e:
             print(f"更新访问次数失败: {e}")
             return False
+    
+    def bump_access(self, memory_ids: List[str]) -> bool:
+        """用一条 UPDATE 语句批量更新多条记忆的访问次数"""
+        if not memory_ids:
+            return True
+        
+        placeholders = ", ".join("?" * len(memory_ids))
+        try:
+            with self._write_lock:
+                self._writer.execute(f'''
+                    UPDATE memories 
+                    SET access_count = access_count + 1, last_accessed = ?
+                    WHERE id IN ({placeholders})
+                ''', (datetime.now().isoformat(), *memory_ids))
+            return True
+        except Exception as e:
+            print(f"更新访问次数失败: {e}")
+            return False
+
+# 全局记忆存储，避免每个节点重复打开数据库和执行建表语句
+_STORAGE: Optional[MemoryStorage] = None
+
+def get_storage() -> MemoryStorage:
+    """获取共享的记忆存储实例"""
+    global _STORAGE
+    if _STORAGE is None:
+        _STORAGE = MemoryStorage()
+    return _STORAGE
 
 # 3. 记忆管理节点
 
-def calculate_importance(content: str, context: Dict[str, Any] = None) -> float:
-    """计算内容重要性"""
+# 关键词模式在模块加载时编译一次，每次调用只需对内容做一遍扫描
+_IMPORTANT_RE = re.compile(
+    "|".join(map(re.escape, ["重要", "紧急", "关键", "必须", "记住", "important", "urgent", "critical"])),
+    re.IGNORECASE
+)
+_EMOTION_RE = re.compile(
+    "|".join(map(re.escape, ["开心", "难过", "生气", "担心", "happy", "sad", "angry", "worried"])),
+    re.IGNORECASE
+)
+
+# 关键词 -> 标签
+_TAG_KEYWORDS = {
+    "工作": "工作", "work": "工作",
+    "学习": "学习", "study": "学习",
+    "家庭": "家庭", "family": "家庭",
+    "健康": "健康", "health": "健康",
+    "技术": "技术", "tech": "技术",
+    # 时间相关的标签
+    "今天": "今天", "today": "今天",
+    "明天": "明天", "tomorrow": "明天",
+    "昨天": "昨天", "yesterday": "昨天"
+}
+_TAG_RE = re.compile("|".join(map(re.escape, _TAG_KEYWORDS)), re.IGNORECASE)
+
+# 时间衰减：记忆的新鲜度按 exp(-λ·天数) 平滑下降
+RECENCY_DECAY = 0.05
+# 相关性排序中词重叠所占的权重 α，其余 1 - α 为新鲜度
+RELEVANCE_WEIGHT = 0.7
+# 重要性 × 新鲜度低于该阈值的长期记忆会被遗忘
+FORGET_THRESHOLD = 0.3
+# 长期记忆的容量上限，超出后自动丢弃最旧的记忆
+LONG_TERM_MEMORY_SIZE = 50
+# 节点读取缺省的列表字段时共用的不可变空值，不必每次新建空列表
+_EMPTY: Tuple = ()
+
+def memory_epoch(memory: Dict[str, Any]) -> float:
+    """记忆时间戳的 Unix 秒数；首次解析 ISO 字符串后缓存在记忆项上"""
+    epoch = memory.get("_epoch")
+    if epoch is None:
+        epoch = memory["_epoch"] = datetime.fromisoformat(memory["timestamp"]).timestamp()
+    return epoch
+
+class MemoryArena:
+    """
+    记忆列表的结构数组视图
+    
+    把重要性、访问次数和时间戳各自收集到连续的 numpy 数组中，
+    遗忘、排序和统计都用数组运算一次完成，不再在 Python 层逐条遍历记忆字典。
+    """
+    
+    def __init__(self, memories: List[Dict[str, Any]]):
+        self.memories = memories
+        count = len(memories)
+        self.importance = np.fromiter((memory["importance"] for memory in memories), dtype=np.float32, count=count)
+        self.access = np.fromiter((memory["access_count"] for memory in memories), dtype=np.int32, count=count)
+        self.ts_ns = np.fromiter(
+            (int(memory_epoch(memory) * 1e9) for memory in memories),
+            dtype=np.int64, count=count
+        )
+    
+    def recency(self, now_ns: int, decay: float = RECENCY_DECAY) -> np.ndarray:
+        """所有记忆的新鲜度：刚产生的记忆为 1，随时间按 exp(-λ·天数) 衰减"""
+        # 只分配一个结果数组，缩放和求指数都原地完成，不产生中间临时数组
+        out = np.subtract(self.ts_ns, now_ns, dtype=np.float64)
+        out *= decay / 86_400e9
+        return np.exp(out, out=out)
+    
+    def relevance(self, overlap: np.ndarray, now_ns: int, weight: float = RELEVANCE_WEIGHT) -> np.ndarray:
+        """相关性 = α·词重叠 + (1 - α)·新鲜度，在新鲜度数组上原地累加"""
+        out = self.recency(now_ns)
+        out *= 1 - weight
+        out += weight * overlap
+        return out
+    
+    def select(self, indices: np.ndarray) -> List[Dict[str, Any]]:
+        """按下标取出记忆"""
+        return [self.memories[i] for i in indices]
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    得分最高的 k 个下标，按得分从高到低排列
+    
+    先用 argpartition 在 O(N) 内选出前 k 个，再只对这 k 个排序，
+    避免为了取前几名而对全部记忆做 O(N log N) 的完整排序。
+    """
+    if len(scores) > k:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    # 得分相同时下标小的在前，与稳定排序的结果一致
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+@lru_cache(maxsize=4096)
+def calculate_importance(content: str) -> float:
+    """计算内容重要性（按内容缓存，重复输入直接命中）"""
     importance = 0.5  # 基础重要性
     
     # 基于长度的加分
     length_bonus = min(len(content) / 200, 0.3)
     importance += length_bonus
     
-    # 基于关键词的加分
-    important_keywords = ["重要", "紧急", "关键", "必须", "记住", "important", "urgent", "critical"]
-    keyword_count = sum(1 for keyword in important_keywords if keyword.lower() in content.lower())
+    # 基于关键词的加分（每个关键词只计一次）
+    keyword_count = len({match.lower() for match in _IMPORTANT_RE.findall(content)})
     importance += keyword_count * 0.1
     
     # 基于提问的加分（问题通常更重要）
@@ -220,37 +497,16 @@ def calculate_importance(content: str, context: Dict[str, Any] = None) -> float:
         importance += 0.2
     
     # 基于情感的加分（情感表达可能重要）
-    emotion_keywords = ["开心", "难过", "生气", "担心", "happy", "sad", "angry", "worried"]
-    emotion_count = sum(1 for keyword in emotion_keywords if keyword.lower() in content.lower())
+    emotion_count = len({match.lower() for match in _EMOTION_RE.findall(content)})
     importance += emotion_count * 0.1
     
     return min(importance, 1.0)
 
-def extract_tags(content: str) -> List[str]:
-    """从内容中提取标签"""
-    tags = []
-    
-    # 简单的标签提取
-    if "工作" in content or "work" in content.lower():
-        tags.append("工作")
-    if "学习" in content or "study" in content.lower():
-        tags.append("学习")
-    if "家庭" in content or "family" in content.lower():
-        tags.append("家庭")
-    if "健康" in content or "health" in content.lower():
-        tags.append("健康")
-    if "技术" in content or "tech" in content.lower():
-        tags.append("技术")
-    
-    # 提取时间相关的标签
-    if "今天" in content or "today" in content.lower():
-        tags.append("今天")
-    if "明天" in content or "tomorrow" in content.lower():
-        tags.append("明天")
-    if "昨天" in content or "yesterday" in content.lower():
-        tags.append("昨天")
-    
-    return list(set(tags))  # 去重
+@lru_cache(maxsize=4096)
+def extract_tags(content: str) -> Tuple[str, ...]:
+    """从内容中提取标签（按内容缓存，返回不可变元组以便安全共享）"""
+    # 简单的标签提取：一次扫描找出所有关键词，按首次出现的顺序去重，结果与哈希种子无关
+    return tuple(dict.fromkeys(_TAG_KEYWORDS[match.lower()] for match in _TAG_RE.findall(content)))
 
 def store_short_term_memory(state: MemoryState) -> MemoryState:
     """
@@ -259,31 +515,34 @@ def store_short_term_memory(state: MemoryState) -> MemoryState:
     print_step("存储短期记忆")
     
     current_input = state.get("current_input", "")
-    short_term_memory = state.get("short_term_memory", [])
+    short_term_memory = state.get("short_term_memory", _EMPTY)
     user_id = state.get("user_id", "default")
     session_id = state.get("session_id", "default")
     
     if not current_input.strip():
-        return state
+        return {}
     
     # 创建记忆项
-    memory_id = hashlib.md5(f"{current_input}_{time.time()}".encode()).hexdigest()
+    memory_id = uuid4().hex
+    now = datetime.now()
+    timestamp = now.isoformat()
     
     memory_item = {
         "id": memory_id,
         "content": current_input,
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": timestamp,
         "importance": calculate_importance(current_input),
-        "tags": extract_tags(current_input),
+        "tags": list(extract_tags(current_input)),
         "user_id": user_id,
         "session_id": session_id,
         "access_count": 0,
-        "last_accessed": datetime.now().isoformat(),
-        "embedding": [hash(current_input) % 100 / 100.0]  # 简化的嵌入
+        "last_accessed": timestamp,
+        "embedding": [hash(current_input) % 100 / 100.0],  # 简化的嵌入
+        "_epoch": now.timestamp()  # 时间戳的数值形式，免得每次评分都重新解析 ISO 字符串
     }
     
-    # 添加到短期记忆
-    short_term_memory.append(memory_item)
+    # 添加到短期记忆（新建列表，不修改输入状态中的列表）
+    short_term_memory = [*short_term_memory, memory_item]
     
     print(f"已存储短期记忆: {current_input[:50]}...")
     print(f"重要性评分: {memory_item['importance']:.2f}")
@@ -299,25 +558,28 @@ def consolidate_long_term_memory(state: MemoryState) -> MemoryState:
     """
     print_step("整合到长期记忆")
     
-    short_term_memory = state.get("short_term_memory", [])
-    long_term_memory = state.get("long_term_memory", [])
-    memory_storage = MemoryStorage()
+    short_term_memory = state.get("short_term_memory", _EMPTY)
+    long_term_memory = state.get("long_term_memory")
+    if not isinstance(long_term_memory, deque):
+        long_term_memory = deque(long_term_memory or (), maxlen=LONG_TERM_MEMORY_SIZE)
+    memory_storage = get_storage()
     
-    # 将重要的短期记忆转移到长期记忆
+    # 将重要的短期记忆转移到长期记忆，在一个事务中批量写入数据库
+    important_memories = [
+        memory_item for memory_item in short_term_memory
+        if memory_item["importance"] > 0.6  # 重要性阈值
+    ]
     consolidated_count = 0
-    for memory_item in short_term_memory:
-        if memory_item["importance"] > 0.6:  # 重要性阈值
-            # 存储到数据库
-            if memory_storage.store_memory(memory_item):
-                long_term_memory.append(memory_item)
-                consolidated_count += 1
+    if memory_storage.store_many(important_memories):
+        long_term_memory.extend(important_memories)  # 超出容量时自动丢弃最旧的记忆
+        consolidated_count = len(important_memories)
     
     print(f"已整合 {consolidated_count} 条记忆到长期记忆")
     
     # 清空短期记忆
     return {
         "short_term_memory": [],
-        "long_term_memory": long_term_memory[-50:]  # 保留最近50条长期记忆
+        "long_term_memory": long_term_memory
     }
 
 def retrieve_relevant_memories(state: MemoryState) -> MemoryState:
@@ -328,30 +590,33 @@ def retrieve_relevant_memories(state: MemoryState) -> MemoryState:
     
     current_input = state.get("current_input", "")
     user_id = state.get("user_id", "default")
-    long_term_memory = state.get("long_term_memory", [])
+    long_term_memory = state.get("long_term_memory", _EMPTY)
     
-    memory_storage = MemoryStorage()
+    memory_storage = get_storage()
     
     # 从数据库检索相关记忆
     retrieved_memories = memory_storage.retrieve_memories(user_id, current_input, limit=5)
     
-    # 更新访问次数
-    for memory in retrieved_memories:
-        memory_storage.update_access_count(memory["id"])
+    # 批量更新访问次数
+    memory_storage.bump_access([memory["id"] for memory in retrieved_memories])
     
     # 合并长期记忆和检索记忆
-    all_memories = long_term_memory + retrieved_memories
+    arena = MemoryArena([*long_term_memory, *retrieved_memories])
     
-    # 简单的相关性排序
-    def calculate_relevance(memory_item):
-        content = memory_item["content"]
-        common_words = set(content.lower().split()) & set(current_input.lower().split())
-        return len(common_words)
+    # 相关性 = α·词重叠 + (1 - α)·新鲜度；查询分词只做一次，记忆的分词结果缓存在记忆项上
+    query_tokens = set(current_input.lower().split())
     
-    all_memories.sort(key=calculate_relevance, reverse=True)
+    def token_overlap(memory_item):
+        tokens = memory_item.get("_tokens")
+        if tokens is None:
+            tokens = memory_item["_tokens"] = frozenset(memory_item["content"].lower().split())
+        return len(query_tokens & tokens)
+    
+    overlap = np.fromiter(map(token_overlap, arena.memories), dtype=np.float64, count=len(arena.memories))
+    relevance = arena.relevance(overlap, time.time_ns())
     
     # 保留最相关的记忆
-    relevant_memories = all_memories[:10]
+    relevant_memories = arena.select(top_k_indices(relevance, 10))
     
     print(f"检索到 {len(retrieved_memories)} 条相关记忆")
     print(f"总共相关记忆: {len(relevant_memories)} 条")
@@ -367,8 +632,7 @@ def manage_context_window(state: MemoryState) -> MemoryState:
     print_step("管理上下文窗口")
     
     current_input = state.get("current_input", "")
-    retrieval_results = state.get("retrieval_results", [])
-    context_window = state.get("context_window", [])
+    retrieval_results = state.get("retrieval_results", _EMPTY)
     
     # 上下文窗口大小限制
     max_context_size = 5
@@ -411,34 +675,24 @@ def intelligent_forgetting(state: MemoryState) -> MemoryState:
     """
     print_step("执行智能遗忘")
     
-    long_term_memory = state.get("long_term_memory", [])
-    user_id = state.get("user_id", "default")
+    long_term_memory = state.get("long_term_memory", _EMPTY)
     
     if len(long_term_memory) < 20:  # 记忆数量较少，不需要遗忘
-        return state
+        return {}
     
     # 遗忘策略
-    current_time = datetime.now()
-    forgotten_count = 0
-    
-    # 1. 遗忘时间过久且不重要的记忆
-    filtered_memory = []
-    for memory in long_term_memory:
-        memory_time = datetime.fromisoformat(memory["timestamp"])
-        days_old = (current_time - memory_time).days
-        
-        # 遗忘条件：超过30天且重要性低于0.3且访问次数少于2次
-        if days_old > 30 and memory["importance"] < 0.3 and memory["access_count"] < 2:
-            forgotten_count += 1
-            continue
-        
-        filtered_memory.append(memory)
+    arena = MemoryArena(long_term_memory)
     
-    # 2. 如果记忆仍然太多，保留最重要的
-    if len(filtered_memory) > 50:
-        filtered_memory.sort(key=lambda x: (x["importance"], x["access_count"]), reverse=True)
-        filtered_memory = filtered_memory[:50]
-        forgotten_count += len(long_term_memory) - len(filtered_memory)
+    # 1. 遗忘随时间衰减后价值过低的记忆：重要性 × 新鲜度低于阈值
+    kept = np.flatnonzero(arena.importance * arena.recency(time.time_ns()) >= FORGET_THRESHOLD)
+    
+    # 2. 如果记忆仍然太多，按 (重要性, 访问次数) 保留最重要的
+    if len(kept) > LONG_TERM_MEMORY_SIZE:
+        order = np.lexsort((arena.access[kept], arena.importance[kept]))[::-1]
+        kept = kept[order[:LONG_TERM_MEMORY_SIZE]]
+    
+    filtered_memory = deque(arena.select(kept), maxlen=LONG_TERM_MEMORY_SIZE)
+    forgotten_count = len(long_term_memory) - len(filtered_memory)
     
     print(f"智能遗忘完成，遗忘了 {forgotten_count} 条记忆")
     print(f"保留记忆: {len(filtered_memory)} 条")
@@ -453,29 +707,24 @@ def generate_memory_summary(state: MemoryState) -> MemoryState:
     """
     print_step("生成记忆摘要")
     
-    short_term_memory = state.get("short_term_memory", [])
-    long_term_memory = state.get("long_term_memory", [])
-    context_window = state.get("context_window", [])
+    short_term_memory = state.get("short_term_memory", _EMPTY)
+    long_term_memory = state.get("long_term_memory", _EMPTY)
+    context_window = state.get("context_window", _EMPTY)
     user_id = state.get("user_id", "default")
     session_id = state.get("session_id", "default")
     
     # 统计信息
     total_memories = len(short_term_memory) + len(long_term_memory)
     
-    # 标签统计
-    all_tags = []
-    for memory in short_term_memory + long_term_memory:
-        all_tags.extend(memory.get("tags", []))
-    tag_counts = {}
-    for tag in all_tags:
-        tag_counts[tag] = tag_counts.get(tag, 0) + 1
-    
-    # 重要性统计
-    importances = [memory["importance"] for memory in short_term_memory + long_term_memory]
-    avg_importance = sum(importances) / len(importances) if importances else 0
-    
-    # 访问统计
-    total_access = sum(memory["access_count"] for memory in long_term_memory)
+    # 标签、重要性和访问次数在一次遍历中累计
+    tag_counts = Counter()
+    total_importance = 0.0
+    total_access = 0
+    for memory in chain(short_term_memory, long_term_memory):
+        tag_counts.update(memory.get("tags", ()))
+        total_importance += memory["importance"]
+        total_access += memory["access_count"]
+    avg_importance = total_importance / total_memories if total_memories else 0
     
     summary = {
         "user_id": user_id,
@@ -484,10 +733,10 @@ def generate_memory_summary(state: MemoryState) -> MemoryState:
         "short_term_count": len(short_term_memory),
         "long_term_count": len(long_term_memory),
         "context_window_size": len(context_window),
-        "tag_distribution": tag_counts,
+        "tag_distribution": dict(tag_counts),
         "average_importance": avg_importance,
         "total_access_count": total_access,
-        "most_common_tags": sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)[:5],
+        "most_common_tags": tag_counts.most_common(5),
         "generated_at": datetime.now().isoformat()
     }
     
@@ -506,10 +755,10 @@ def update_memory_stats(state: MemoryState) -> MemoryState:
     """
     print_step("更新记忆统计")
     
-    short_term_memory = state.get("short_term_memory", [])
-    long_term_memory = state.get("long_term_memory", [])
-    context_window = state.get("context_window", [])
-    retrieval_results = state.get("retrieval_results", [])
+    short_term_memory = state.get("short_term_memory", _EMPTY)
+    long_term_memory = state.get("long_term_memory", _EMPTY)
+    context_window = state.get("context_window", _EMPTY)
+    retrieval_results = state.get("retrieval_results", _EMPTY)
     
     stats = {
         "short_term_count": len(short_term_memory),
@@ -566,7 +815,7 @@ def demo_basic_memory():
     initial_state = {
         "current_input": "我需要记住明天有一个重要的会议",
         "short_term_memory": [],
-        "long_term_memory": [],
+        "long_term_memory": deque(maxlen=LONG_TERM_MEMORY_SIZE),
         "context_window": [],
         "memory_summary": {},
         "user_id": "user123",
@@ -618,7 +867,7 @@ def demo_memory_retrieval():
         state = {
             "current_input": memory_text,
             "short_term_memory": [],
-            "long_term_memory": [],
+            "long_term_memory": deque(maxlen=LONG_TERM_MEMORY_SIZE),
             "context_window": [],
             "memory_summary": {},
             "user_id": "user456",
@@ -636,7 +885,7 @@ def demo_memory_retrieval():
     query_state = {
         "current_input": "我明天有什么计划？",
         "short_term_memory": [],
-        "long_term_memory": [],
+        "long_term_memory": deque(maxlen=LONG_TERM_MEMORY_SIZE),
         "context_window": [],
         "memory_summary": {},
         "user_id": "user456",
@@ -666,7 +915,7 @@ def demo_memory_management():
         state = {
             "current_input": memory_text,
             "short_term_memory": [],
-            "long_term_memory": [],
+            "long_term_memory": deque(maxlen=LONG_TERM_MEMORY_SIZE),
             "context_window": [],
             "memory_summary": {},
             "user_id": "user789",
@@ -0,0 +1,34 @@
+"""
+03-advanced/custom_tools 的回归测试
+
+运行：python -m pytest 03-advanced/test_custom_tools.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from custom_tools import ToolManager
+
+
+def test_unserializable_write_invalidates_query_cache(tmp_path, monkeypatch):
+    """输入无法序列化的写操作也要清除查询缓存，之后的查询能读到新数据"""
+    monkeypatch.chdir(tmp_path)  # 工具的数据库和工作目录都建在临时目录中
+    manager = ToolManager()
+    query = {"operation": "query", "table": "products"}
+
+    before = manager.execute_tool("database_tool", query)["data"]
+
+    # bytes 无法被 orjson 序列化，写操作无法生成缓存键
+    inserted = manager.execute_tool("database_tool", {
+        "operation": "insert",
+        "table": "products",
+        "data": {"name": b"blob", "price": 1.0}
+    })
+    assert inserted["status"] == "success"
+
+    after = manager.execute_tool("database_tool", query)["data"]
+
+    assert len(after) == len(before) + 1
+    assert manager.cache_info()["hits"] == 0
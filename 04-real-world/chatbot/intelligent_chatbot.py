@@ -12,21 +12,34 @@
 - 个性化回复生成
 """
 
-from typing import TypedDict, List, Dict, Any, Literal
+from typing import TypedDict, List, Dict, Tuple, Any, Optional, Callable, Literal
 from langgraph.graph import StateGraph, END
 import sys
 import os
 import json
 import time
 import sqlite3
+import threading
+import queue
+import weakref
+from contextlib import contextmanager
+from functools import lru_cache, partial
 from datetime import datetime, timedelta
 import re
 import random
+import logging
+from collections import Counter, OrderedDict
 
 # 添加父目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from utils import print_step, print_result, print_error, Config
 
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# 调试模式：在导入时读取一次，开启后输出各节点的处理细节
+DEBUG_MODE = os.getenv("DEBUG_MODE", "false").lower() == "true"
+
 # 1. 状态定义
 class ChatbotState(TypedDict):
     """
@@ -45,6 +58,7 @@ class ChatbotState(TypedDict):
     next_action: str
     memory_items: List[Dict[str, Any]]
     bot_mood: str
+    turn_ts: str  # 本轮对话开始时间，各节点共用，避免反复格式化当前时间
 
 class IntentType:
     """意图类型常量"""
@@ -67,19 +81,114 @@ class EmotionType:
 
 # 2. 数据库管理
 
+# 状态中保留的最近对话条数；完整历史保存在数据库中
+HISTORY_LIMIT = 10
+
+def _now() -> str:
+    """当前时间的 ISO 格式字符串"""
+    return datetime.now().isoformat()
+
 class ConversationDB:
     """
     对话数据库管理
     """
     
+    # 建立连接后执行的性能调优 PRAGMA
+    CONNECTION_PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000",
+        "PRAGMA temp_store=MEMORY"
+    )
+    
+    # 本进程中已完成建表的数据库路径，同一数据库不再重复执行建表语句
+    _initialized_paths = set()
+    
     def __init__(self, db_path: str = "chatbot.db"):
         self.db_path = db_path
+        
+        # 每个线程复用自己的连接，避免每次读写都重新打开数据库
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        
+        # 写操作交给一个后台线程按提交顺序串行执行，回复路径无需等待磁盘提交
+        self._write_queue: queue.Queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, args=(self._write_queue,), daemon=True)
+        self._writer.start()
+        
+        # 实例被回收或解释器退出时先写完排队的操作，再关闭所有线程的连接
+        self._finalizer = weakref.finalize(self, self._shutdown, self._write_queue, self._writer, self._connections)
+        
         self.init_database()
     
+    def _conn(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接，首次使用时创建"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+            # 查询结果直接按列名访问，无需再逐行组装字典
+            conn.row_factory = sqlite3.Row
+            for pragma in self.CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    @staticmethod
+    def _write_loop(write_queue: queue.Queue):
+        """后台写线程：依次执行排队的写操作，收到 None 时退出"""
+        while True:
+            task = write_queue.get()
+            try:
+                if task is None:
+                    return
+                task()
+            except Exception as e:
+                logger.error("后台写入数据库失败: %s", e)
+            finally:
+                write_queue.task_done()
+    
+    @staticmethod
+    def _shutdown(write_queue: queue.Queue, writer: threading.Thread, connections: List[sqlite3.Connection]):
+        """停止后台写线程（先执行完已排队的写操作），然后关闭所有线程创建的连接"""
+        write_queue.put(None)
+        writer.join()
+        for conn in connections:
+            conn.close()
+        connections.clear()
+    
+    def submit(self, task: Callable[[], Any]):
+        """把写操作交给后台线程执行，立即返回"""
+        self._write_queue.put(task)
+    
+    def flush(self):
+        """等待所有已提交的写操作完成"""
+        self._write_queue.join()
+    
+    def close(self):
+        """关闭数据库连接"""
+        self._finalizer()
+    
+    @contextmanager
+    def transaction(self):
+        """在一个事务中执行多条写操作，只提交一次；出错时整体回滚"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn.cursor()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    
     def init_database(self):
         """初始化数据库"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        if self.db_path in ConversationDB._initialized_paths:
+            return
+        
+        cursor = self._conn().cursor()
         
         # 用户表
         cursor.execute('''
@@ -89,10 +198,16 @@ class ConversationDB:
                 preferences TEXT,
                 first_seen TEXT,
                 last_seen TEXT,
-                conversation_count INTEGER DEFAULT 0
+                conversation_count INTEGER DEFAULT 0,
+                intent_counts TEXT DEFAULT '{}'
             )
         ''')
         
+        # 旧版本创建的用户表没有意图计数列，补上
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(users)")}
+        if "intent_counts" not in columns:
+            cursor.execute("ALTER TABLE users ADD COLUMN intent_counts TEXT DEFAULT '{}'")
+        
         # 对话会话表
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS sessions (
@@ -133,31 +248,51 @@ class ConversationDB:
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        # 按用户取最近消息的索引：反向扫描即得到 (timestamp DESC, id DESC) 顺序，
+        # 行号隐含在索引末尾，无需额外排序
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_msg_user_ts ON messages (user_id, timestamp)
+        ''')
+        
+        # 按会话查询消息的索引
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_msg_session ON messages (session_id)
+        ''')
+        
+        # 按用户取重要记忆的索引
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_mem_user_importance ON memories (user_id, importance DESC)
+        ''')
+        
+        ConversationDB._initialized_paths.add(self.db_path)
     
-    def save_user(self, user_id: str, username: str = None, preferences: Dict = None):
+    def save_user(self, user_id: str, username: str = None, preferences: Dict = None,
+                  timestamp: Optional[str] = None):
         """保存用户信息"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        timestamp = timestamp or _now()
+        cursor = self._conn().cursor()
         
         cursor.execute('''
-            INSERT OR REPLACE INTO users (user_id, username, preferences, first_seen, last_seen, conversation_count)
+            INSERT OR REPLACE INTO users (user_id, username, preferences, first_seen, last_seen, conversation_count, intent_counts)
             VALUES (?, ?, ?, 
                 COALESCE((SELECT first_seen FROM users WHERE user_id = ?), ?),
                 ?,
-                COALESCE((SELECT conversation_count FROM users WHERE user_id = ?), 0) + 1
+                COALESCE((SELECT conversation_count FROM users WHERE user_id = ?), 0) + 1,
+                COALESCE((SELECT intent_counts FROM users WHERE user_id = ?), '{}')
             )
         ''', (user_id, username, json.dumps(preferences or {}), 
-              user_id, datetime.now().isoformat(), datetime.now().isoformat(), user_id))
-        
-        conn.commit()
-        conn.close()
+              user_id, timestamp, timestamp, user_id, user_id))
     
-    def save_session(self, session_id: str, user_id: str):
+    def save_user_session(self, user_id: str, session_id: str, timestamp: Optional[str] = None):
+        """在一个事务中保存用户和会话信息"""
+        with self.transaction():
+            self.save_user(user_id, timestamp=timestamp)
+            self.save_session(session_id, user_id, timestamp=timestamp)
+    
+    def save_session(self, session_id: str, user_id: str, timestamp: Optional[str] = None):
         """保存会话"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        timestamp = timestamp or _now()
+        cursor = self._conn().cursor()
         
         cursor.execute('''
             INSERT OR REPLACE INTO sessions (session_id, user_id, start_time, end_time, message_count, sentiment_score)
@@ -167,58 +302,105 @@ class ConversationDB:
                 COALESCE((SELECT message_count FROM sessions WHERE session_id = ?), 0),
                 COALESCE((SELECT sentiment_score FROM sessions WHERE session_id = ?), 0.0)
             )
-        ''', (session_id, user_id, session_id, datetime.now().isoformat(), 
-              session_id, datetime.now().isoformat(), session_id, session_id))
-        
-        conn.commit()
-        conn.close()
+        ''', (session_id, user_id, session_id, timestamp, 
+              session_id, timestamp, session_id, session_id))
     
     def save_message(self, session_id: str, user_id: str, message_type: str, 
                      content: str, intent: str, emotion: str):
         """保存消息"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        self.save_messages(session_id, user_id, [(message_type, content, intent, emotion)])
+    
+    def save_messages(self, session_id: str, user_id: str, messages: List[Tuple[str, str, str, str]],
+                      timestamp: Optional[str] = None):
+        """在一个事务中批量保存消息，messages 的每一项为 (消息类型, 内容, 意图, 情感)"""
+        if not messages:
+            return
         
-        cursor.execute('''
-            INSERT INTO messages (session_id, user_id, message_type, content, intent, emotion, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (session_id, user_id, message_type, content, intent, emotion, datetime.now().isoformat()))
+        timestamp = timestamp or _now()
+        rows = [
+            (session_id, user_id, message_type, content, intent, emotion, timestamp)
+            for message_type, content, intent, emotion in messages
+        ]
         
-        # 更新会话的消息计数
-        cursor.execute('''
-            UPDATE sessions SET message_count = message_count + 1, end_time = ?
-            WHERE session_id = ?
-        ''', (datetime.now().isoformat(), session_id))
+        with self.transaction() as cursor:
+            cursor.executemany('''
+                INSERT INTO messages (session_id, user_id, message_type, content, intent, emotion, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            
+            # 更新会话的消息计数
+            cursor.execute('''
+                UPDATE sessions SET message_count = message_count + ?, end_time = ?
+                WHERE session_id = ?
+            ''', (len(rows), timestamp, session_id))
+            
+            # 累加用户消息的意图计数，偏好话题无需每轮扫描历史消息
+            user_intents = [
+                (intent, intent, user_id)
+                for message_type, _, intent, _ in messages
+                if message_type == "user" and intent
+            ]
+            cursor.executemany('''
+                UPDATE users SET intent_counts = json_set(
+                    COALESCE(intent_counts, '{}'), '$.' || ?,
+                    COALESCE(json_extract(intent_counts, '$.' || ?), 0) + 1
+                )
+                WHERE user_id = ?
+            ''', user_intents)
+    
+    def save_turn(self, session_id: str, user_id: str, user_message: str, 
+                  bot_message: str, intent: str, emotion: str, timestamp: Optional[str] = None):
+        """保存一轮对话：用户消息和机器人回复在同一个事务中写入"""
+        self.save_messages(session_id, user_id, [
+            ("user", user_message, intent, emotion),
+            ("bot", bot_message, intent, emotion)
+        ], timestamp)
+    
+    def save_memories(self, user_id: str, memories: List[Tuple[str, str, float]],
+                      timestamp: Optional[str] = None):
+        """在一个事务中批量保存记忆，memories 的每一项为 (内容, 记忆类型, 重要性)"""
+        if not memories:
+            return
         
-        conn.commit()
-        conn.close()
-    
-    def get_conversation_history(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        timestamp = timestamp or _now()
+        with self.transaction() as cursor:
+            cursor.executemany('''
+                INSERT INTO memories (user_id, content, memory_type, importance, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [
+                (user_id, content, memory_type, importance, timestamp)
+                for content, memory_type, importance in memories
+            ])
+    
+    def get_intent_counts(self, user_id: str) -> Dict[str, int]:
+        """获取用户各意图的累计次数"""
+        self.flush()  # 先让排队中的写操作落库，保证读到最新数据
+        row = self._conn().execute(
+            "SELECT intent_counts FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row and row[0] else {}
+    
+    def get_conversation_history(self, user_id: str, limit: int = HISTORY_LIMIT) -> List[Dict[str, Any]]:
         """获取对话历史"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        self.flush()  # 先让排队中的写操作落库，保证读到最新数据
+        cursor = self._conn().cursor()
         
         cursor.execute('''
-            SELECT content, message_type, intent, emotion, timestamp
+            SELECT content, message_type AS type, intent, emotion, timestamp
             FROM messages
             WHERE user_id = ?
-            ORDER BY timestamp DESC
+            ORDER BY timestamp DESC, id DESC
             LIMIT ?
         ''', (user_id, limit))
         
         rows = cursor.fetchall()
-        conn.close()
-        
-        return [
-            {
-                "content": row[0],
-                "type": row[1],
-                "intent": row[2],
-                "emotion": row[3],
-                "timestamp": row[4]
-            }
-            for row in reversed(rows)  # 按时间正序返回
-        ]
+        
+        return [dict(row) for row in reversed(rows)]  # 按时间正序返回
+
+@lru_cache(maxsize=None)
+def get_db(db_path: str = "chatbot.db") -> ConversationDB:
+    """获取共享的对话数据库实例，各节点复用同一组连接"""
+    return ConversationDB(db_path)
 
 # 3. 核心处理函数
 
@@ -258,17 +440,21 @@ class IntentClassifier:
                 r"下次聊|回聊"
             ]
         }
+        
+        # 把全部意图合并成一个正则：每个意图是一个前瞻分支，按意图顺序依次尝试，
+        # 命中分支末尾的空命名组给出意图名，一次 match 调用即可完成分类
+        self._intent_re = re.compile(
+            "|".join(
+                f"(?=.*?(?:{'|'.join(patterns)}))(?P<{intent}>)"
+                for intent, patterns in self.intent_patterns.items()
+            ),
+            re.IGNORECASE | re.DOTALL
+        )
     
     def classify(self, message: str) -> str:
         """分类意图"""
-        message_lower = message.lower()
-        
-        for intent, patterns in self.intent_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, message_lower):
-                    return intent
-        
-        return IntentType.UNKNOWN
+        match = self._intent_re.match(message)
+        return match.lastgroup if match else IntentType.UNKNOWN
 
 class EmotionAnalyzer:
     """情感分析器"""
@@ -281,60 +467,115 @@ class EmotionAnalyzer:
             EmotionType.HAPPY: ["高兴", "快乐", "幸福", "开心", "happy", "joyful", "excited"],
             EmotionType.SAD: ["难过", "伤心", "沮丧", "失望", "sad", "disappointed", "depressed"]
         }
+        
+        # 情感按编号排列
+        self._emotions = tuple(self.emotion_words)
+        
+        # 关键词 -> 打包的情感计数增量：第 i 个字节对应第 i 种情感，
+        # 同一个词属于多种情感时对应的多个字节都为 1。
+        # 每个关键词只计一次，单个情感的得分不超过其关键词数，一个字节足够容纳
+        self._keyword_emotions: Dict[str, int] = {}
+        for emotion_id, words in enumerate(self.emotion_words.values()):
+            for word in words:
+                word = word.lower()
+                self._keyword_emotions[word] = self._keyword_emotions.get(word, 0) + (1 << (8 * emotion_id))
+        
+        # 所有关键词合并成一个正则，一次扫描找出消息中出现的全部关键词；
+        # 放在前瞻中使相互重叠的关键词也都能被找到
+        self._keyword_re = re.compile(
+            "(?=(" + "|".join(map(re.escape, self._keyword_emotions)) + "))",
+            re.IGNORECASE
+        )
     
     def analyze(self, message: str) -> str:
         """分析情感"""
-        message_lower = message.lower()
+        # 每个关键词只计一次
+        found = {word.lower() for word in self._keyword_re.findall(message)}
         
-        scores = {}
-        for emotion, words in self.emotion_words.items():
-            score = sum(1 for word in words if word in message_lower)
-            scores[emotion] = score
+        # 一次整数求和累加所有情感的计数，再按字节拆出各情感得分
+        counts = sum(map(self._keyword_emotions.__getitem__, found)).to_bytes(len(self._emotions), "little")
         
-        if not scores or max(scores.values()) == 0:
+        best_score = max(counts, default=0)
+        if best_score == 0:
             return EmotionType.NEUTRAL
         
-        return max(scores.items(), key=lambda x: x[1])[0]
+        # 得分相同时取编号较小（先声明）的情感
+        return self._emotions[counts.index(best_score)]
+
+# 提取数字的预编译正则
+_NUMBER_RE = re.compile(r'\d+')
 
 class EntityExtractor:
     """实体提取器"""
     
+    # 时间相关实体的预编译正则，类加载时编译一次
+    time_patterns = {
+        "今天": re.compile(r"今天|today", re.IGNORECASE),
+        "明天": re.compile(r"明天|tomorrow", re.IGNORECASE),
+        "昨天": re.compile(r"昨天|yesterday", re.IGNORECASE),
+        "本周": re.compile(r"这周|本周|this week", re.IGNORECASE),
+        "下周": re.compile(r"下周|next week", re.IGNORECASE)
+    }
+    
+    # 问题类型关键词，按优先级排列：价格 > 功能 > 技术
+    _QTYPE_KEYWORDS = (
+        ("价格", "pricing"), ("多少钱", "pricing"), ("cost", "pricing"),
+        ("功能", "feature"), ("用途", "feature"), ("feature", "feature"),
+        ("技术", "technical"), ("实现", "technical"), ("technical", "technical")
+    )
+    
     def extract(self, message: str) -> Dict[str, Any]:
         """提取实体"""
         entities = {}
         
         # 提取时间相关实体
-        time_patterns = {
-            "今天": r"今天|today",
-            "明天": r"明天|tomorrow",
-            "昨天": r"昨天|yesterday",
-            "本周": r"这周|本周|this week",
-            "下周": r"下周|next week"
-        }
-        
-        for entity_type, pattern in time_patterns.items():
-            if re.search(pattern, message.lower()):
+        for entity_type, pattern in self.time_patterns.items():
+            if pattern.search(message):
                 entities[entity_type] = True
         
         # 提取数字
-        numbers = re.findall(r'\d+', message)
+        numbers = _NUMBER_RE.findall(message)
         if numbers:
             entities["numbers"] = [int(n) for n in numbers]
         
         # 提取问题类型
-        if "价格" in message or "多少钱" in message or "cost" in message.lower():
-            entities["question_type"] = "pricing"
-        elif "功能" in message or "用途" in message or "feature" in message.lower():
-            entities["question_type"] = "feature"
-        elif "技术" in message or "实现" in message or "technical" in message.lower():
-            entities["question_type"] = "technical"
+        message_lower = message.lower()
+        for keyword, question_type in self._QTYPE_KEYWORDS:
+            if keyword in message_lower:
+                entities["question_type"] = question_type
+                break
         
         return entities
 
+class MessageAnalyzer:
+    """
+    消息分析器：意图识别、情感分析和实体提取的统一入口
+    
+    三个分析器各自只做一次预编译的扫描；合并成一次调用后，
+    调用方只需一次规范化和一次缓存查找就能拿到全部分析结果。
+    """
+    
+    def __init__(self, intent_classifier: IntentClassifier, emotion_analyzer: EmotionAnalyzer,
+                 entity_extractor: EntityExtractor):
+        self.intent_classifier = intent_classifier
+        self.emotion_analyzer = emotion_analyzer
+        self.entity_extractor = entity_extractor
+    
+    def analyze(self, message: str) -> Tuple[str, str, Dict[str, Any]]:
+        """分析消息，返回 (意图, 情感, 实体)"""
+        return (
+            self.intent_classifier.classify(message),
+            self.emotion_analyzer.analyze(message),
+            self.entity_extractor.extract(message)
+        )
+
 class ResponseGenerator:
     """回复生成器"""
     
-    def __init__(self):
+    def __init__(self, seed: Optional[int] = None):
+        # 独立的随机数生成器：不与全局随机状态共享，指定 seed 时回复可复现
+        self._rng = random.Random(seed)
+        
         self.response_templates = {
             IntentType.GREETING: [
                 "您好！很高兴为您服务，有什么可以帮助您的吗？",
@@ -393,34 +634,39 @@ class ResponseGenerator:
             EmotionType.ANGRY: "请冷静下来，我会全力帮您解决问题。",
             EmotionType.NEGATIVE: "我理解您的心情，让我们一起找到解决方案。"
         }
+        
+        # 把嵌套的模板结构展平为 (意图, 问题类型) -> 模板元组的查找表，
+        # 没有细分问题类型的意图以 "default" 作为问题类型
+        self._templates: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+        for intent, templates in self.response_templates.items():
+            if isinstance(templates, dict):
+                for question_type, options in templates.items():
+                    self._templates[(intent, question_type)] = tuple(options)
+            else:
+                self._templates[(intent, "default")] = tuple(templates)
     
     def generate(self, intent: str, emotion: str, entities: Dict[str, Any], 
                  context: Dict[str, Any]) -> str:
         """生成回复"""
-        # 基础回复模板
-        if intent in self.response_templates:
-            templates = self.response_templates[intent]
-            
-            if isinstance(templates, dict):
-                question_type = entities.get("question_type", "default")
-                template = templates.get(question_type, templates.get("default", templates["default"][0]))
-            else:
-                template = random.choice(templates) if isinstance(templates, list) else templates
-        else:
-            template = random.choice(self.response_templates[IntentType.UNKNOWN])
+        return self.personalize(self.compose(intent, emotion, entities), context)
+    
+    def compose(self, intent: str, emotion: str, entities: Dict[str, Any]) -> str:
+        """生成不含个性化称呼的回复，只取决于消息本身的分析结果，可以跨用户缓存"""
+        # 基础回复模板：先按问题类型细分，再退回意图的默认模板，最后退回未知意图
+        templates = (
+            self._templates.get((intent, entities.get("question_type", "default")))
+            or self._templates.get((intent, "default"))
+            or self._templates[(IntentType.UNKNOWN, "default")]
+        )
+        template = templates[self._rng.randrange(len(templates))]
         
         # 添加情感回应
         emotion_response = ""
         if emotion in self.emotion_responses and emotion != EmotionType.NEUTRAL:
             emotion_response = self.emotion_responses[emotion] + " "
         
-        # 个性化回复
-        personal_response = ""
-        if context.get("user_name"):
-            personal_response = f"{context['user_name']}，"
-        
         # 组合回复
-        response = f"{personal_response}{emotion_response}{template}"
+        response = f"{emotion_response}{template}"
         
         # 添加额外信息
         if entities:
@@ -428,76 +674,93 @@ class ResponseGenerator:
                 response += f" 我注意到您提到了数字：{', '.join(map(str, entities['numbers']))}。"
         
         return response
+    
+    def personalize(self, response: str, context: Dict[str, Any]) -> str:
+        """在回复前加上用户称呼"""
+        if context.get("user_name"):
+            return f"{context['user_name']}，{response}"
+        return response
 
 # 4. 对话工作流节点
 
+# 分析器和回复生成器在模块加载时创建一次，正则和模板表只构建一次，供每轮对话复用
+_INTENT_CLASSIFIER = IntentClassifier()
+_EMOTION_ANALYZER = EmotionAnalyzer()
+_ENTITY_EXTRACTOR = EntityExtractor()
+_RESPONSE_GENERATOR = ResponseGenerator()
+
+_MESSAGE_ANALYZER = MessageAnalyzer(_INTENT_CLASSIFIER, _EMOTION_ANALYZER, _ENTITY_EXTRACTOR)
+
+def normalize_message(message: str) -> str:
+    """规范化消息：所有匹配都不区分大小写，也不依赖首尾空白"""
+    return message.strip().lower()
+
+# 分析结果按规范化后的消息缓存，重复的消息直接命中缓存
+@lru_cache(maxsize=4096)
+def _cached_analysis(message: str) -> Tuple[str, str, Dict[str, Any]]:
+    return _MESSAGE_ANALYZER.analyze(message)
+
+def analyze_text(message: str) -> Tuple[str, str, Dict[str, Any]]:
+    """分析消息的意图、情感和实体（带缓存），实体返回副本以免调用方修改缓存中的结果"""
+    intent, emotion, entities = _cached_analysis(normalize_message(message))
+    return intent, emotion, dict(entities)
+
+# 回复缓存：以规范化后的消息为键，保存意图、情感、实体和不含称呼的回复，
+# 命中时跳过分析和生成回复，整条处理链路退化为一次字典查找
+RESPONSE_CACHE_SIZE = 2048
+_EXACT_CACHE: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+def get_cached_response(message: str) -> Optional[Dict[str, Any]]:
+    """查找回复缓存，命中时移到队尾（LRU）"""
+    key = normalize_message(message)
+    cached = _EXACT_CACHE.get(key)
+    if cached is not None:
+        _EXACT_CACHE.move_to_end(key)
+    return cached
+
+def cache_response(message: str, intent: str, emotion: str, entities: Dict[str, Any], response: str):
+    """写入回复缓存，超出容量时淘汰最久未使用的条目"""
+    key = normalize_message(message)
+    _EXACT_CACHE[key] = {
+        "intent": intent,
+        "emotion": emotion,
+        "entities": dict(entities),
+        "response": response
+    }
+    _EXACT_CACHE.move_to_end(key)
+    if len(_EXACT_CACHE) > RESPONSE_CACHE_SIZE:
+        _EXACT_CACHE.popitem(last=False)
+
 def initialize_conversation(state: ChatbotState) -> ChatbotState:
     """初始化对话"""
-    print_step("初始化对话")
+    logger.debug("初始化对话")
     
     user_id = state.get("user_id", "default_user")
     session_id = state.get("session_id", f"session_{int(time.time())}")
-    current_message = state.get("current_message", "")
+    turn_ts = _now()
     
-    # 初始化数据库连接
-    db = ConversationDB()
+    db = get_db()
     
-    # 保存用户和会话信息
-    db.save_user(user_id)
-    db.save_session(session_id, user_id)
-    
-    # 获取用户历史对话
+    # 获取用户历史对话和累计的意图计数
     conversation_history = db.get_conversation_history(user_id)
+    user_profile = {**state.get("user_profile", {}), "intent_counts": db.get_intent_counts(user_id)}
     
-    # 保存用户消息
-    conversation_db = ConversationDB()
-    conversation_db.save_message(session_id, user_id, "user", current_message, "", "")
+    # 保存用户和会话信息（后台写入）
+    db.submit(partial(db.save_user_session, user_id, session_id, turn_ts))
     
-    print(f"对话初始化完成 - 用户: {user_id}, 会话: {session_id}")
+    logger.debug("对话初始化完成 - 用户: %s, 会话: %s", user_id, session_id)
     
     return {
         "conversation_history": conversation_history,
+        "user_profile": user_profile,
         "user_id": user_id,
-        "session_id": session_id
+        "session_id": session_id,
+        "turn_ts": turn_ts
     }
 
-def analyze_message(state: ChatbotState) -> ChatbotState:
-    """分析消息"""
-    print_step("分析用户消息")
-    
-    current_message = state.get("current_message", "")
-    
-    # 意图识别
-    intent_classifier = IntentClassifier()
-    intent = intent_classifier.classify(current_message)
-    
-    # 情感分析
-    emotion_analyzer = EmotionAnalyzer()
-    emotion = emotion_analyzer.analyze(current_message)
-    
-    # 实体提取
-    entity_extractor = EntityExtractor()
-    entities = entity_extractor.extract(current_message)
-    
-    print(f"分析结果 - 意图: {intent}, 情感: {emotion}, 实体: {entities}")
-    
-    return {
-        "intent": intent,
-        "emotion": emotion,
-        "entities": entities
-    }
-
-def manage_context(state: ChatbotState) -> ChatbotState:
-    """管理上下文"""
-    print_step("管理对话上下文")
-    
-    conversation_history = state.get("conversation_history", [])
-    intent = state.get("intent", "")
-    entities = state.get("entities", {})
-    emotion = state.get("emotion", "")
-    user_id = state.get("user_id", "")
-    
-    # 构建上下文
+def build_context(conversation_history: List[Dict[str, Any]], user_profile: Dict[str, Any], user_id: str,
+                  intent: str, entities: Dict[str, Any], emotion: str) -> Dict[str, Any]:
+    """根据对话历史和本轮分析结果构建上下文"""
     context = {
         "recent_messages": conversation_history[-3:],  # 最近3条消息
         "user_id": user_id,
@@ -519,22 +782,16 @@ def manage_context(state: ChatbotState) -> ChatbotState:
             
             if topics:
                 context["user_interests"] = topics
-                context["favorite_topics"] = max(set(topics), key=topics.count)
     
-    print(f"上下文管理完成 - 消息数: {len(conversation_history)}")
+    # 最常见的话题来自数据库中累计的意图计数
+    intent_counts = Counter(user_profile.get("intent_counts", {}))
+    if intent_counts:
+        context["favorite_topics"] = intent_counts.most_common(1)[0][0]
     
-    return {
-        "context": context
-    }
+    return context
 
-def retrieve_memory(state: ChatbotState) -> ChatbotState:
-    """检索记忆"""
-    print_step("检索相关记忆")
-    
-    user_id = state.get("user_id", "")
-    intent = state.get("intent", "")
-    entities = state.get("entities", {})
-    
+def retrieve_memory_items(intent: str, entities: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """检索与本轮意图和实体相关的记忆"""
     # 模拟记忆检索（实际项目中会查询真实的记忆数据库）
     memory_items = []
     
@@ -561,15 +818,76 @@ def retrieve_memory(state: ChatbotState) -> ChatbotState:
             "relevance": 0.7
         })
     
-    print(f"检索到 {len(memory_items)} 条相关记忆")
+    return memory_items
+
+def cache_check(state: ChatbotState) -> ChatbotState:
+    """检查回复缓存，命中时直接填入意图、情感、实体和回复"""
+    cached = get_cached_response(state.get("current_message", ""))
+    if cached is None:
+        logger.debug("回复缓存未命中")
+        return {"response": ""}
+    
+    logger.debug("回复缓存命中")
+    
+    intent, emotion = cached["intent"], cached["emotion"]
+    entities = dict(cached["entities"])
+    
+    # 命中时跳过了分析节点，这里按本轮历史和用户资料构建上下文、检索记忆
+    context = build_context(state.get("conversation_history", []), state.get("user_profile", {}),
+                            state.get("user_id", ""), intent, entities, emotion)
+    memory_items = retrieve_memory_items(intent, entities)
+    
+    # 缓存中的回复不含称呼，按本轮上下文重新加上
+    return {
+        "intent": intent,
+        "emotion": emotion,
+        "entities": entities,
+        "context": context,
+        "memory_items": memory_items,
+        "response": _RESPONSE_GENERATOR.personalize(cached["response"], context)
+    }
+
+def route_after_cache_check(state: ChatbotState) -> Literal["analyze", "save_conversation"]:
+    """缓存命中时直接保存对话，否则进入分析"""
+    return "save_conversation" if state.get("response") else "analyze"
+
+def analyze_message(state: ChatbotState) -> ChatbotState:
+    """
+    分析消息，并在同一个节点中构建上下文、检索记忆
+    
+    三步都只依赖当前消息和初始化时读取的历史，合并为一个节点后
+    每轮少两次节点调度和状态合并。
+    """
+    logger.debug("分析用户消息")
+    
+    current_message = state.get("current_message", "")
+    conversation_history = state.get("conversation_history", [])
+    user_id = state.get("user_id", "")
+    
+    # 意图识别、情感分析和实体提取，一次缓存查找得到全部结果
+    intent, emotion, entities = analyze_text(current_message)
+    
+    logger.debug("分析结果 - 意图: %s, 情感: %s, 实体: %s", intent, emotion, entities)
+    
+    # 管理对话上下文
+    context = build_context(conversation_history, state.get("user_profile", {}), user_id, intent, entities, emotion)
+    logger.debug("上下文管理完成 - 消息数: %s", len(conversation_history))
+    
+    # 检索相关记忆
+    memory_items = retrieve_memory_items(intent, entities)
+    logger.debug("检索到 %s 条相关记忆", len(memory_items))
     
     return {
+        "intent": intent,
+        "emotion": emotion,
+        "entities": entities,
+        "context": context,
         "memory_items": memory_items
     }
 
 def generate_response(state: ChatbotState) -> ChatbotState:
     """生成回复"""
-    print_step("生成回复")
+    logger.debug("生成回复")
     
     intent = state.get("intent", "")
     emotion = state.get("emotion", "")
@@ -577,9 +895,8 @@ def generate_response(state: ChatbotState) -> ChatbotState:
     context = state.get("context", {})
     memory_items = state.get("memory_items", [])
     
-    # 生成回复
-    response_generator = ResponseGenerator()
-    response = response_generator.generate(intent, emotion, entities, context)
+    # 生成回复（先不加称呼，以便跨用户缓存）
+    response = _RESPONSE_GENERATOR.compose(intent, emotion, entities)
     
     # 如果有相关记忆，添加记忆相关内容
     if memory_items:
@@ -587,7 +904,10 @@ def generate_response(state: ChatbotState) -> ChatbotState:
         if high_relevance_memories:
             response += " 我记得您之前也关心过这个问题。"
     
-    print(f"生成回复: {response[:50]}...")
+    cache_response(state.get("current_message", ""), intent, emotion, entities, response)
+    response = _RESPONSE_GENERATOR.personalize(response, context)
+    
+    logger.debug("生成回复: %.50s...", response)
     
     return {
         "response": response
@@ -595,34 +915,38 @@ def generate_response(state: ChatbotState) -> ChatbotState:
 
 def save_conversation(state: ChatbotState) -> ChatbotState:
     """保存对话"""
-    print_step("保存对话记录")
+    logger.debug("保存对话记录")
     
     user_id = state.get("user_id", "")
     session_id = state.get("session_id", "")
     response = state.get("response", "")
     intent = state.get("intent", "")
     emotion = state.get("emotion", "")
+    turn_ts = state.get("turn_ts") or _now()
     
-    # 保存机器人回复
-    db = ConversationDB()
-    db.save_message(session_id, user_id, "bot", response, intent, emotion)
+    # 用户消息（此时意图和情感已分析完成）和机器人回复在一个事务中保存，由后台线程写入
+    db = get_db()
+    db.submit(partial(db.save_turn, session_id, user_id, state.get("current_message", ""),
+                      response, intent, emotion, turn_ts))
     
-    # 更新对话历史
-    conversation_history = state.get("conversation_history", [])
-    conversation_history.append({
-        "type": "user",
-        "content": state.get("current_message", ""),
-        "intent": intent,
-        "emotion": emotion,
-        "timestamp": datetime.now().isoformat()
-    })
-    conversation_history.append({
-        "type": "bot",
-        "content": response,
-        "timestamp": datetime.now().isoformat()
-    })
+    # 更新对话历史：只保留最近 HISTORY_LIMIT 条，状态大小不随对话轮数增长
+    conversation_history = [
+        *state.get("conversation_history", []),
+        {
+            "type": "user",
+            "content": state.get("current_message", ""),
+            "intent": intent,
+            "emotion": emotion,
+            "timestamp": turn_ts
+        },
+        {
+            "type": "bot",
+            "content": response,
+            "timestamp": turn_ts
+        }
+    ][-HISTORY_LIMIT:]
     
-    print("对话记录保存完成")
+    logger.debug("对话记录保存完成")
     
     return {
         "conversation_history": conversation_history
@@ -630,7 +954,7 @@ def save_conversation(state: ChatbotState) -> ChatbotState:
 
 def determine_next_action(state: ChatbotState) -> ChatbotState:
     """确定下一步动作"""
-    print_step("确定下一步动作")
+    logger.debug("确定下一步动作")
     
     intent = state.get("intent", "")
     emotion = state.get("emotion", "")
@@ -648,7 +972,7 @@ def determine_next_action(state: ChatbotState) -> ChatbotState:
     else:
         next_action = "continue_conversation"
     
-    print(f"下一步动作: {next_action}")
+    logger.debug("下一步动作: %s", next_action)
     
     return {
         "next_action": next_action
@@ -664,9 +988,8 @@ def build_chatbot_workflow():
     
     # 添加节点
     workflow.add_node("initialize", initialize_conversation)
+    workflow.add_node("cache_check", cache_check)
     workflow.add_node("analyze", analyze_message)
-    workflow.add_node("manage_context", manage_context)
-    workflow.add_node("retrieve_memory", retrieve_memory)
     workflow.add_node("generate_response", generate_response)
     workflow.add_node("save_conversation", save_conversation)
     workflow.add_node("determine_action", determine_next_action)
@@ -675,10 +998,16 @@ def build_chatbot_workflow():
     workflow.set_entry_point("initialize")
     
     # 添加边
-    workflow.add_edge("initialize", "analyze")
-    workflow.add_edge("analyze", "manage_context")
-    workflow.add_edge("manage_context", "retrieve_memory")
-    workflow.add_edge("retrieve_memory", "generate_response")
+    workflow.add_edge("initialize", "cache_check")
+    workflow.add_conditional_edges(
+        "cache_check",
+        route_after_cache_check,
+        {
+            "analyze": "analyze",
+            "save_conversation": "save_conversation"
+        }
+    )
+    workflow.add_edge("analyze", "generate_response")
     workflow.add_edge("generate_response", "save_conversation")
     workflow.add_edge("save_conversation", "determine_action")
     
@@ -750,7 +1079,7 @@ def demo_conversation():
             print(f"\n🤖 机器人: {bot_response}")
             
             # 显示分析结果（调试用）
-            if os.getenv("DEBUG_MODE", "false").lower() == "true":
+            if DEBUG_MODE:
                 print(f"\n🔍 调试信息:")
                 print(f"  意图: {result.get('intent', '')}")
                 print(f"  情感: {result.get('emotion', '')}")
@@ -804,6 +1133,10 @@ def test_emotion_analysis():
 
 # 主程序
 if __name__ == "__main__":
+    # 调试模式下输出各节点的处理细节
+    logging.basicConfig(format="%(message)s")
+    logger.setLevel(logging.DEBUG if DEBUG_MODE else logging.WARNING)
+    
     print("💬 LangGraph 智能对话系统")
     print("=" * 60)
     
@@ -12,13 +12,18 @@
 - 实时监控和报告
 """
 
-from typing import TypedDict, List, Dict, Any, Literal
+from typing import TypedDict, List, Dict, Tuple, Any, Optional, Literal, Annotated, Callable, Union
 from langgraph.graph import StateGraph, END
 import sys
 import os
-import json
+import orjson
+import operator
 import time
 import sqlite3
+import threading
+import weakref
+from functools import lru_cache
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import random
 import uuid
@@ -37,14 +42,15 @@ class WorkflowState(TypedDict):
     workflow_type: str
     initiator: str
     request_data: Dict[str, Any]
-    approval_steps: List[Dict[str, Any]]
+    approval_steps: Annotated[List[Dict[str, Any]], operator.add]  # 审批节点只追加已完成步骤的增量，按 step_id 合并
     current_step: int
     step_results: List[Dict[str, Any]]
-    parallel_tasks: List[Dict[str, Any]]
+    parallel_tasks: Annotated[List[Dict[str, Any]], operator.add]  # 各并行任务节点各自返回结果，由 reducer 合并
     notifications: List[Dict[str, Any]]
     final_result: Dict[str, Any]
-    audit_log: List[Dict[str, Any]]
+    audit_log: Annotated[List[Dict[str, Any]], operator.add]  # 各节点只返回新增的审计记录，由 commit_state 统一写库
     error_log: List[Dict[str, Any]]
+    pending_db_ops: Annotated[List[Tuple[str, tuple]], operator.add]  # 待写库的操作，在 commit_state 节点一次性提交
 
 class TaskStatus:
     """任务状态常量"""
@@ -65,19 +71,67 @@ class WorkflowType:
 
 # 2. 数据库管理
 
+def _now() -> str:
+    """当前时间的 ISO 格式字符串"""
+    return datetime.now().isoformat()
+
+def _dumps(value: Any) -> str:
+    """把数据序列化为 JSON 文本写入数据库（orjson 比标准库 json 快数倍）"""
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+
 class WorkflowDB:
     """
     工作流数据库管理
     """
     
+    # 建立连接后执行的性能调优 PRAGMA：WAL 模式下写入只追加日志页，读操作不再被写锁阻塞
+    CONNECTION_PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-20000"
+    )
+    
     def __init__(self, db_path: str = "workflow.db"):
         self.db_path = db_path
+        
+        # 长期持有一个连接供所有方法复用，避免每次读写都重新打开数据库；
+        # 自动提交模式下每条语句即是一个事务，连接可跨线程共享，由锁串行化访问
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        for pragma in self.CONNECTION_PRAGMAS:
+            self.conn.execute(pragma)
+        self._lock = threading.Lock()
+        
+        # 实例被回收或解释器退出时关闭连接
+        self._finalizer = weakref.finalize(self, self.conn.close)
+        
         self.init_database()
     
+    def close(self):
+        """关闭数据库连接"""
+        self._finalizer()
+    
+    @contextmanager
+    def transaction(self):
+        """在一个事务中执行多条写操作，只提交一次；出错时整体回滚"""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn.cursor()
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+    
     def init_database(self):
         """初始化数据库"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self._lock:
+            self._create_tables(self.conn.cursor())
+    
+    @staticmethod
+    def _create_tables(cursor: sqlite3.Cursor):
+        """创建所有表"""
         
         # 工作流实例表
         cursor.execute('''
@@ -152,61 +206,105 @@ class WorkflowDB:
                 timestamp TEXT
             )
         ''')
-        
-        conn.commit()
-        conn.close()
-    
-    def create_workflow(self, workflow_id: str, workflow_type: str, 
-                       initiator: str, request_data: Dict[str, Any]):
-        """创建工作流实例"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+    
+    # 各类写操作的语句，apply_ops 按这里的顺序执行，保证先建工作流实例再更新其状态
+    WRITE_STATEMENTS = {
+        "workflow": '''
             INSERT INTO workflow_instances 
             (workflow_id, workflow_type, initiator, status, request_data, created_at, updated_at)
             VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        ''',
+        "approval_step": '''
+            INSERT INTO approval_steps (step_id, workflow_id, step_name, approver, status, assigned_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''',
+        "approval_step_update": '''
+            UPDATE approval_steps
+            SET status = ?, decision = ?, comments = ?, completed_at = ?
+            WHERE step_id = ?
+        ''',
+        "task_execution": '''
+            INSERT INTO task_executions
+            (task_id, workflow_id, task_name, task_type, status, input_data, output_data,
+             execution_time, error_message, started_at, completed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''',
+        "status": '''
+            UPDATE workflow_instances 
+            SET status = ?, current_step = COALESCE(?, current_step), updated_at = ?
+            WHERE workflow_id = ?
+        ''',
+        "audit": '''
+            INSERT INTO audit_log (workflow_id, actor, action, details, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        '''
+    }
+    
+    def apply_ops(self, ops: List[Tuple[str, tuple]]):
+        """在一个事务中执行一组写操作，每项为 (操作类型, 参数)，同类操作用一次 executemany 写入"""
+        if not ops:
+            return
+        
+        with self.transaction() as cursor:
+            for kind, sql in self.WRITE_STATEMENTS.items():
+                rows = [params for op_kind, params in ops if op_kind == kind]
+                if rows:
+                    cursor.executemany(sql, rows)
+    
+    @staticmethod
+    def workflow_op(workflow_id: str, workflow_type: str, initiator: str,
+                    request_data: Dict[str, Any], now: Optional[str] = None) -> Tuple[str, tuple]:
+        """创建工作流实例的写操作，创建时间和更新时间共用同一个时间戳"""
+        now = now or _now()
+        return ("workflow", (
             workflow_id, workflow_type, initiator, TaskStatus.PENDING,
-            json.dumps(request_data), datetime.now().isoformat(), datetime.now().isoformat()
+            _dumps(request_data), now, now
         ))
-        
-        conn.commit()
-        conn.close()
     
-    def update_workflow_status(self, workflow_id: str, status: str, current_step: int = None):
-        """更新工作流状态"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        if current_step is not None:
-            cursor.execute('''
-                UPDATE workflow_instances 
-                SET status = ?, current_step = ?, updated_at = ?
-                WHERE workflow_id = ?
-            ''', (status, current_step, datetime.now().isoformat(), workflow_id))
-        else:
-            cursor.execute('''
-                UPDATE workflow_instances 
-                SET status = ?, updated_at = ?
-                WHERE workflow_id = ?
-            ''', (status, datetime.now().isoformat(), workflow_id))
-        
-        conn.commit()
-        conn.close()
+    @staticmethod
+    def approval_step_ops(workflow_id: str, steps: List[Dict[str, Any]]) -> List[Tuple[str, tuple]]:
+        """写入审批步骤的写操作"""
+        return [
+            ("approval_step", (s["step_id"], workflow_id, s["name"], s["approver"], s["status"], s["assigned_at"]))
+            for s in steps
+        ]
     
-    def log_audit(self, workflow_id: str, actor: str, action: str, details: str):
-        """记录审计日志"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO audit_log (workflow_id, actor, action, details, timestamp)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (workflow_id, actor, action, details, datetime.now().isoformat()))
-        
-        conn.commit()
-        conn.close()
+    @staticmethod
+    def approval_step_update_op(step: Dict[str, Any]) -> Tuple[str, tuple]:
+        """更新审批步骤决策结果的写操作"""
+        return ("approval_step_update", (
+            step["status"], step["decision"], step["comments"], step["completed_at"], step["step_id"]
+        ))
+    
+    @staticmethod
+    def task_execution_ops(workflow_id: str, tasks: List[Dict[str, Any]]) -> List[Tuple[str, tuple]]:
+        """写入任务执行记录的写操作"""
+        return [
+            ("task_execution", (
+                t["task_id"], workflow_id, t["task_name"], t["task_type"], t["result"]["status"],
+                _dumps(t["input_data"]), _dumps(t["result"].get("result")),
+                t["result"]["execution_time"], t["result"].get("error"),
+                t["started_at"], t["result"]["completed_at"]
+            ))
+            for t in tasks
+        ]
+    
+    @staticmethod
+    def status_op(workflow_id: str, status: str, current_step: int = None,
+                  now: Optional[str] = None) -> Tuple[str, tuple]:
+        """更新工作流状态的写操作，current_step 为 None 时保持原值"""
+        return ("status", (status, current_step, now or _now(), workflow_id))
+    
+    @staticmethod
+    def audit_op(entry: Dict[str, Any]) -> Tuple[str, tuple]:
+        """写入一条审计记录的写操作"""
+        return ("audit", (entry["workflow_id"], entry["actor"], entry["action"], entry["details"], entry["timestamp"]))
+
+
+@lru_cache(maxsize=None)
+def get_db(db_path: str = "workflow.db") -> WorkflowDB:
+    """获取共享的工作流数据库实例，各节点复用同一个连接"""
+    return WorkflowDB(db_path)
 
 # 3. 业务逻辑组件
 
@@ -235,35 +333,38 @@ class ApprovalEngine:
                 ]
             }
         }
+        
+        # 条件字符串在构造时解析一次，编译为判断函数，生成审批步骤时直接调用
+        for rules in self.approval_rules.values():
+            for step_rule in rules["steps"]:
+                if "condition" in step_rule:
+                    step_rule["predicate"] = self._compile_condition(step_rule["condition"])
+    
+    @staticmethod
+    def _compile_condition(condition: str) -> Callable[[Dict[str, Any]], bool]:
+        """把 "字段 > 阈值" 形式的条件编译为判断函数"""
+        field, threshold = condition.split(">")
+        field = field.strip()
+        threshold = int(threshold.strip())
+        return lambda request_data: request_data.get(field, 0) > threshold
     
     def generate_approval_steps(self, workflow_type: str, request_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """生成审批步骤"""
         rules = self.approval_rules.get(workflow_type, {})
         steps = []
+        now = _now()
         
         for step_rule in rules.get("steps", []):
-            should_include = True
-            
-            # 检查条件
-            if "condition" in step_rule:
-                condition = step_rule["condition"]
-                if "amount" in condition:
-                    amount = request_data.get("amount", 0)
-                    threshold = int(condition.split(">")[1].strip())
-                    should_include = amount > threshold
-                elif "days" in condition:
-                    days = request_data.get("days", 0)
-                    threshold = int(condition.split(">")[1].strip())
-                    should_include = days > threshold
-            
-            if should_include:
+            # 检查条件（没有条件的步骤总是包含）
+            predicate = step_rule.get("predicate")
+            if predicate is None or predicate(request_data):
                 step = {
                     "step_id": str(uuid.uuid4()),
                     "name": step_rule["name"],
                     "approver": step_rule["approver"],
                     "required": step_rule.get("required", False),
                     "status": TaskStatus.PENDING,
-                    "assigned_at": datetime.now().isoformat()
+                    "assigned_at": now
                 }
                 steps.append(step)
         
@@ -425,6 +526,7 @@ class NotificationManager:
             channels = ["email"]
         
         notifications = []
+        now = _now()
         
         for channel in channels:
             if channel in self.notification_channels:
@@ -435,7 +537,7 @@ class NotificationManager:
                     "channel": channel,
                     "type": notification_type,
                     "status": "sent",
-                    "sent_at": datetime.now().isoformat()
+                    "sent_at": now
                 }
                 notifications.append(notification)
                 
@@ -445,6 +547,28 @@ class NotificationManager:
 
 # 4. 工作流节点
 
+def current_approval_steps(approval_steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按 step_id 合并审批步骤的增量更新，返回每个步骤的最新状态（保持原有顺序）"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for step in approval_steps:
+        step_id = step["step_id"]
+        merged[step_id] = {**merged[step_id], **step} if step_id in merged else step
+    return list(merged.values())
+
+# 审批引擎在模块加载时创建一次，审批规则只编译一次，供每次工作流复用
+_APPROVAL_ENGINE = ApprovalEngine()
+
+def audit_entry(workflow_id: str, actor: str, action: str, details: str,
+                now: Optional[str] = None) -> Dict[str, Any]:
+    """构造一条审计记录，先累积在状态中，工作流结束时批量写入"""
+    return {
+        "workflow_id": workflow_id,
+        "actor": actor,
+        "action": action,
+        "details": details,
+        "timestamp": now or _now()
+    }
+
 def initialize_workflow(state: WorkflowState) -> WorkflowState:
     """初始化工作流"""
     print_step("初始化工作流")
@@ -454,15 +578,10 @@ def initialize_workflow(state: WorkflowState) -> WorkflowState:
     request_data = state.get("request_data", {})
     
     workflow_id = str(uuid.uuid4())
+    now = _now()
     
     # 生成审批步骤
-    approval_engine = ApprovalEngine()
-    approval_steps = approval_engine.generate_approval_steps(workflow_type, request_data)
-    
-    # 初始化数据库
-    db = WorkflowDB()
-    db.create_workflow(workflow_id, workflow_type, initiator, request_data)
-    db.log_audit(workflow_id, "system", "workflow_created", f"工作流 {workflow_type} 已创建")
+    approval_steps = _APPROVAL_ENGINE.generate_approval_steps(workflow_type, request_data)
     
     print(f"工作流初始化完成 - ID: {workflow_id}")
     print(f"审批步骤数: {len(approval_steps)}")
@@ -473,7 +592,11 @@ def initialize_workflow(state: WorkflowState) -> WorkflowState:
         "current_step": 0,
         "step_results": [],
         "notifications": [],
-        "audit_log": []
+        "audit_log": [audit_entry(workflow_id, "system", "workflow_created", f"工作流 {workflow_type} 已创建", now)],
+        "pending_db_ops": [
+            WorkflowDB.workflow_op(workflow_id, workflow_type, initiator, request_data, now),
+            *WorkflowDB.approval_step_ops(workflow_id, approval_steps)
+        ]
     }
 
 def validate_request(state: WorkflowState) -> WorkflowState:
@@ -510,93 +633,91 @@ def validate_request(state: WorkflowState) -> WorkflowState:
     })
     
     # 记录结果
+    now = _now()
     step_results = state.get("step_results", [])
     step_results.append({
         "step": "validation",
         "result": validation_result,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now
     })
     
-    # 记录审计日志
-    db = WorkflowDB()
-    db.log_audit(workflow_id, "system", "validation_completed", 
-               f"验证结果: {validation_result['status']}")
-    
     print(f"验证完成: {validation_result['status']}")
     
     return {
-        "step_results": step_results
+        "step_results": step_results,
+        "audit_log": [audit_entry(workflow_id, "system", "validation_completed",
+                                  f"验证结果: {validation_result['status']}", now)]
     }
 
-def execute_parallel_tasks(state: WorkflowState) -> WorkflowState:
-    """执行并行任务"""
-    print_step("执行并行任务")
-    
-    workflow_id = state.get("workflow_id", "")
-    workflow_type = state.get("workflow_type", "")
-    request_data = state.get("request_data", "")
-    
-    # 定义并行任务
-    parallel_tasks = []
-    task_executor = TaskExecutor()
-    
-    # 基于工作流类型定义不同的并行任务
-    if workflow_type == WorkflowType.PURCHASE_APPROVAL:
-        tasks = [
-            {
-                "name": "vendor_check",
-                "handler": "system_integration",
-                "data": {"system_name": "vendor_system", "vendor": request_data.get("vendor")}
-            },
-            {
-                "name": "budget_check",
-                "handler": "system_integration", 
-                "data": {"system_name": "budget_system", "amount": request_data.get("amount")}
-            },
-            {
-                "name": "generate_purchase_order",
-                "handler": "document_generation",
-                "data": {"doc_type": "purchase_order", "content": request_data}
-            }
-        ]
-    elif workflow_type == WorkflowType.LEAVE_REQUEST:
-        tasks = [
-            {
-                "name": "check_leave_balance",
-                "handler": "system_integration",
-                "data": {"system_name": "hr_system", "employee": request_data.get("employee_name")}
-            },
-            {
-                "name": "check_team_schedule",
-                "handler": "system_integration",
-                "data": {"system_name": "schedule_system", "dates": [request_data.get("start_date"), request_data.get("end_date")]}
-            }
-        ]
-    else:
-        tasks = []
-    
-    # 并行执行任务
-    task_results = []
-    for task in tasks:
+# 各工作流类型的并行任务：每个任务是图中的一个节点，验证通过后同时扇出，
+# 由 LangGraph 并发调度，全部完成后在 parallel_tasks 节点汇合
+PARALLEL_TASKS: Dict[str, List[Dict[str, Any]]] = {
+    WorkflowType.PURCHASE_APPROVAL: [
+        {
+            "name": "vendor_check",
+            "handler": "system_integration",
+            "build_data": lambda request_data: {"system_name": "vendor_system", "vendor": request_data.get("vendor")}
+        },
+        {
+            "name": "budget_check",
+            "handler": "system_integration",
+            "build_data": lambda request_data: {"system_name": "budget_system", "amount": request_data.get("amount")}
+        },
+        {
+            "name": "generate_purchase_order",
+            "handler": "document_generation",
+            "build_data": lambda request_data: {"doc_type": "purchase_order", "content": request_data}
+        }
+    ],
+    WorkflowType.LEAVE_REQUEST: [
+        {
+            "name": "check_leave_balance",
+            "handler": "system_integration",
+            "build_data": lambda request_data: {"system_name": "hr_system", "employee": request_data.get("employee_name")}
+        },
+        {
+            "name": "check_team_schedule",
+            "handler": "system_integration",
+            "build_data": lambda request_data: {"system_name": "schedule_system", "dates": [request_data.get("start_date"), request_data.get("end_date")]}
+        }
+    ]
+}
+
+def make_parallel_task_node(task: Dict[str, Any]) -> Callable[[WorkflowState], WorkflowState]:
+    """为一个并行任务创建节点，节点只返回自己的结果，由 reducer 追加到 parallel_tasks"""
+    def run_task(state: WorkflowState) -> WorkflowState:
         print(f"执行任务: {task['name']}")
-        result = task_executor.execute_task(task["handler"], task["data"])
-        task_results.append({
-            "task_name": task["name"],
-            "result": result,
-            "timestamp": datetime.now().isoformat()
-        })
+        input_data = task["build_data"](state.get("request_data", {}))
+        started_at = _now()
+        result = TaskExecutor().execute_task(task["handler"], input_data)
+        return {
+            "parallel_tasks": [{
+                "task_id": str(uuid.uuid4()),
+                "task_name": task["name"],
+                "task_type": task["handler"],
+                "input_data": input_data,
+                "result": result,
+                "started_at": started_at,
+                "timestamp": _now()
+            }]
+        }
     
-    parallel_tasks.extend(task_results)
+    return run_task
+
+def collect_parallel_tasks(state: WorkflowState) -> WorkflowState:
+    """汇合并行任务的结果"""
+    print_step("汇总并行任务")
     
-    # 记录审计日志
-    db = WorkflowDB()
-    db.log_audit(workflow_id, "system", "parallel_tasks_completed", 
-               f"执行了 {len(tasks)} 个并行任务")
+    workflow_id = state.get("workflow_id", "")
+    parallel_tasks = state.get("parallel_tasks", [])
+    now = _now()
     
-    print(f"并行任务执行完成: {len(task_results)} 个任务")
+    print(f"并行任务执行完成: {len(parallel_tasks)} 个任务")
     
     return {
-        "parallel_tasks": parallel_tasks
+        "audit_log": [audit_entry(workflow_id, "system", "parallel_tasks_completed",
+                                  f"执行了 {len(parallel_tasks)} 个并行任务", now)],
+        "pending_db_ops": WorkflowDB.task_execution_ops(workflow_id, parallel_tasks)
     }
 
 def process_approval_steps(state: WorkflowState) -> WorkflowState:
@@ -604,7 +725,7 @@ def process_approval_steps(state: WorkflowState) -> WorkflowState:
     print_step("处理审批步骤")
     
     workflow_id = state.get("workflow_id", "")
-    approval_steps = state.get("approval_steps", [])
+    approval_steps = current_approval_steps(state.get("approval_steps", []))
     current_step = state.get("current_step", 0)
     request_data = state.get("request_data", {})
     
@@ -613,7 +734,7 @@ def process_approval_steps(state: WorkflowState) -> WorkflowState:
     
     if current_step >= len(approval_steps):
         print("所有审批步骤已完成")
-        return state
+        return {}
     
     # 处理当前步骤
     current_approval_step = approval_steps[current_step]
@@ -634,11 +755,16 @@ def process_approval_steps(state: WorkflowState) -> WorkflowState:
         approval_decision = "rejected"
         approval_comments = "需要更多信息，请补充相关文档"
     
-    # 更新审批步骤状态
-    current_approval_step["status"] = TaskStatus.COMPLETED if approval_decision == "approved" else TaskStatus.REJECTED
-    current_approval_step["decision"] = approval_decision
-    current_approval_step["comments"] = approval_comments
-    current_approval_step["completed_at"] = datetime.now().isoformat()
+    now = _now()
+    
+    # 更新审批步骤状态：只生成本步骤变化的字段，由 reducer 追加，不再回传整个步骤列表
+    updated_step = {
+        "step_id": current_approval_step["step_id"],
+        "status": TaskStatus.COMPLETED if approval_decision == "approved" else TaskStatus.REJECTED,
+        "decision": approval_decision,
+        "comments": approval_comments,
+        "completed_at": now
+    }
     
     # 记录审批结果
     step_results.append({
@@ -646,36 +772,39 @@ def process_approval_steps(state: WorkflowState) -> WorkflowState:
         "approver": approver,
         "decision": approval_decision,
         "comments": approval_comments,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now
     })
     
     # 发送通知
     notification_manager = NotificationManager()
     notification_message = f"您的申请已{approval_decision} - {approval_comments}"
     
-    # 更新工作流状态
-    db = WorkflowDB()
+    # 更新工作流状态（审批步骤的决策结果也随本次运行一起写库）
+    db_ops = [WorkflowDB.approval_step_update_op(updated_step)]
     if approval_decision == "rejected":
-        db.update_workflow_status(workflow_id, TaskStatus.REJECTED, current_step)
-        db.log_audit(workflow_id, approver, "approval_rejected", f"拒绝了步骤 {step_name}")
+        db_ops.append(WorkflowDB.status_op(workflow_id, TaskStatus.REJECTED, current_step, now))
+        audit = audit_entry(workflow_id, approver, "approval_rejected", f"拒绝了步骤 {step_name}", now)
     else:
-        db.log_audit(workflow_id, approver, "approval_approved", f"批准了步骤 {step_name}")
+        audit = audit_entry(workflow_id, approver, "approval_approved", f"批准了步骤 {step_name}", now)
     
     print(f"审批步骤完成: {approval_decision}")
     
     return {
-        "approval_steps": approval_steps,
+        "approval_steps": [updated_step],
         "step_results": step_results,
-        "current_step": current_step + 1 if approval_decision == "approved" else current_step
+        "current_step": current_step + 1 if approval_decision == "approved" else current_step,
+        "audit_log": [audit],
+        "pending_db_ops": db_ops
     }
 
 def check_completion_conditions(state: WorkflowState) -> WorkflowState:
     """检查完成条件"""
     print_step("检查完成条件")
     
-    approval_steps = state.get("approval_steps", [])
+    approval_steps = current_approval_steps(state.get("approval_steps", []))
     current_step = state.get("current_step", 0)
     workflow_id = state.get("workflow_id", "")
+    now = _now()
     
     # 检查是否有被拒绝的步骤
     rejected_steps = [step for step in approval_steps if step.get("status") == TaskStatus.REJECTED]
@@ -686,7 +815,7 @@ def check_completion_conditions(state: WorkflowState) -> WorkflowState:
             "status": "rejected",
             "reason": "审批被拒绝",
             "rejected_steps": [step["name"] for step in rejected_steps],
-            "completed_at": datetime.now().isoformat()
+            "completed_at": now
         }
     elif current_step >= len(approval_steps):
         final_status = TaskStatus.COMPLETED
@@ -694,7 +823,7 @@ def check_completion_conditions(state: WorkflowState) -> WorkflowState:
             "status": "approved",
             "reason": "所有审批步骤完成",
             "approved_steps": [step["name"] for step in approval_steps],
-            "completed_at": datetime.now().isoformat()
+            "completed_at": now
         }
     else:
         final_status = TaskStatus.IN_PROGRESS
@@ -705,14 +834,15 @@ def check_completion_conditions(state: WorkflowState) -> WorkflowState:
         }
     
     # 更新数据库状态
+    db_ops = []
     if final_status in [TaskStatus.COMPLETED, TaskStatus.REJECTED]:
-        db = WorkflowDB()
-        db.update_workflow_status(workflow_id, final_status, current_step)
+        db_ops.append(WorkflowDB.status_op(workflow_id, final_status, current_step, now))
     
     print(f"完成条件检查: {final_result['status']}")
     
     return {
-        "final_result": final_result
+        "final_result": final_result,
+        "pending_db_ops": db_ops
     }
 
 def generate_final_report(state: WorkflowState) -> WorkflowState:
@@ -789,10 +919,20 @@ def send_notifications(state: WorkflowState) -> WorkflowState:
         "notifications": notifications
     }
 
+def commit_state(state: WorkflowState) -> WorkflowState:
+    """把本次运行累积的所有写操作（含审计记录）在一个事务中写入数据库"""
+    audit_log = state.get("audit_log", [])
+    db_ops = [*state.get("pending_db_ops", []), *map(WorkflowDB.audit_op, audit_log)]
+    get_db().apply_ops(db_ops)
+    
+    print(f"数据库写入完成: {len(db_ops)} 项操作")
+    
+    return {}
+
 # 5. 路由函数
 
-def route_after_validation(state: WorkflowState) -> Literal["parallel_tasks", "reject"]:
-    """验证后的路由"""
+def route_after_validation(state: WorkflowState) -> Union[Literal["parallel_tasks", "reject"], List[str]]:
+    """验证后的路由：验证通过时扇出到本工作流类型的所有并行任务节点"""
     step_results = state.get("step_results", [])
     
     if step_results:
@@ -802,7 +942,8 @@ def route_after_validation(state: WorkflowState) -> Literal["parallel_tasks", "r
             return "reject"
     
     print("路由: parallel_tasks (验证成功)")
-    return "parallel_tasks"
+    tasks = PARALLEL_TASKS.get(state.get("workflow_type", ""), [])
+    return [task["name"] for task in tasks] or "parallel_tasks"
 
 def route_after_parallel_tasks(state: WorkflowState) -> Literal["approval", "complete"]:
     """并行任务后的路由"""
@@ -821,7 +962,7 @@ def route_after_parallel_tasks(state: WorkflowState) -> Literal["approval", "com
 
 def route_after_approval(state: WorkflowState) -> Literal["next_approval", "complete"]:
     """审批后的路由"""
-    approval_steps = state.get("approval_steps", [])
+    approval_steps = current_approval_steps(state.get("approval_steps", []))
     current_step = state.get("current_step", 0)
     
     # 检查当前审批步骤的结果
@@ -848,11 +989,12 @@ def build_business_automation_workflow():
     # 添加节点
     workflow.add_node("initialize", initialize_workflow)
     workflow.add_node("validate", validate_request)
-    workflow.add_node("parallel_tasks", execute_parallel_tasks)
+    workflow.add_node("parallel_tasks", collect_parallel_tasks)
     workflow.add_node("approval", process_approval_steps)
     workflow.add_node("check_completion", check_completion_conditions)
     workflow.add_node("generate_report", generate_final_report)
     workflow.add_node("notifications", send_notifications)
+    workflow.add_node("commit_state", commit_state)
     
     # 设置入口点
     workflow.set_entry_point("initialize")
@@ -860,11 +1002,19 @@ def build_business_automation_workflow():
     # 添加边
     workflow.add_edge("initialize", "validate")
     
-    # 验证后的条件路由
+    # 每个并行任务一个节点，完成后汇合到 parallel_tasks
+    task_names = [task["name"] for tasks in PARALLEL_TASKS.values() for task in tasks]
+    for tasks in PARALLEL_TASKS.values():
+        for task in tasks:
+            workflow.add_node(task["name"], make_parallel_task_node(task))
+            workflow.add_edge(task["name"], "parallel_tasks")
+    
+    # 验证后的条件路由（验证通过时同时扇出到多个任务节点）
     workflow.add_conditional_edges(
         "validate",
         route_after_validation,
         {
+            **{name: name for name in task_names},
             "parallel_tasks": "parallel_tasks",
             "reject": "generate_report"
         }
@@ -892,7 +1042,8 @@ def build_business_automation_workflow():
     
     workflow.add_edge("generate_report", "check_completion")
     workflow.add_edge("check_completion", "notifications")
-    workflow.add_edge("notifications", END)
+    workflow.add_edge("notifications", "commit_state")
+    workflow.add_edge("commit_state", END)
     
     return workflow.compile()
 
@@ -2,11 +2,13 @@
 工具函数包
 """
 from .config import Config, get_openai_client, print_step, print_result, print_error
+from .reducers import append_bounded
 
 __all__ = [
     "Config",
     "get_openai_client", 
     "print_step",
     "print_result",
-    "print_error"
+    "print_error",
+    "append_bounded"
 ]
\ No newline at end of file
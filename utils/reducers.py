@@ -0,0 +1,21 @@
+"""
+状态归约函数
+"""
+from collections import deque
+from typing import Any, Callable, Deque, Iterable, Optional
+
+def append_bounded(maxlen: int) -> Callable[[Optional[Iterable[Any]], Optional[Iterable[Any]]], Deque[Any]]:
+    """
+    创建一个追加到有界队列的归约函数
+    
+    节点返回的新条目追加到已有历史之后，超过 maxlen 时自动丢弃最旧的条目，
+    因此历史占用的内存和每一步合并的开销都有上限。
+    合并结果总是新的 deque：LangGraph 会在多个通道副本间共享旧值，不能原地修改。
+    """
+    def reducer(left: Optional[Iterable[Any]], right: Optional[Iterable[Any]]) -> Deque[Any]:
+        merged = deque(left or (), maxlen=maxlen)
+        if right:
+            merged.extend(right)
+        return merged
+    
+    return reducer